@@ -0,0 +1,166 @@
+"""
+Admission control at the API layer.
+
+Requests first pass a per-client token bucket (429 when empty), then wait a
+bounded time for one of the global concurrency slots (503 when the queue is
+full or the wait runs out). Admitted requests carry a deadline that upstream
+calls inherit through `remaining_time()`, so a slow upstream can no longer
+hold a request longer than the deadline allows. Rejections carry
+`Retry-After` so well-behaved clients back off instead of retrying at once.
+
+Behind a reverse proxy every request arrives from the proxy's address, so
+clients are identified from `X-Forwarded-For` using `trusted_proxy_hops`:
+the entry that many hops from the right was written by our own proxy, and
+anything further left is client controlled.
+"""
+
+import asyncio
+import json
+import math
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from cachetools import TTLCache
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the work could start"""
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None without one"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets; idle buckets expire once they would be full again"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = TTLCache(maxsize=max_clients, ttl=max(1.0, burst / rate))
+
+    def acquire(self, client: str) -> float:
+        """Take a token for `client`; return 0 when allowed, else seconds until one is available"""
+        now = time.monotonic()
+        tokens, last = self.buckets.get(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens >= 1:
+            self.buckets[client] = (tokens - 1, now)
+            return 0.0
+        self.buckets[client] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+
+class AdmissionControlMiddleware:
+    """Pure ASGI middleware enforcing rate limits, a concurrency cap and deadlines"""
+
+    def __init__(self, app, max_concurrent: int = 128, max_queued: int = 256,
+                 queue_timeout: float = 1.0, deadline: float = 10.0,
+                 rate: float = 0.0, burst: float = 40.0, trusted_proxy_hops: int = 0,
+                 deadline_grace: float = 0.5):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        # Headroom past the deadline so handlers can still answer from cache
+        self.deadline_grace = deadline_grace
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.limiter = TokenBucketLimiter(rate, burst) if rate > 0 else None
+
+        self._slots = asyncio.Semaphore(max_concurrent) if max_concurrent > 0 else None
+        self._queued = 0
+        self.rejected = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0, "deadline": 0}
+
+    def _client_key(self, scope) -> str:
+        if self.trusted_proxy_hops:
+            hops = [
+                hop.strip()
+                for name, value in scope.get("headers") or [] if name == b"x-forwarded-for"
+                for hop in value.decode("latin-1").split(",") if hop.strip()
+            ]
+            if len(hops) >= self.trusted_proxy_hops:
+                return hops[-self.trusted_proxy_hops]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _reject(self, send, status: int, detail: str, retry_after: float):
+        body = json.dumps({"detail": detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.limiter is not None:
+            wait = self.limiter.acquire(self._client_key(scope))
+            if wait:
+                self.rejected["rate_limited"] += 1
+                await self._reject(send, 429, "Too many requests", wait)
+                return
+
+        if self._slots is None:
+            await self._run(scope, receive, send)
+            return
+
+        if self._slots.locked():
+            if self._queued >= self.max_queued:
+                self.rejected["queue_full"] += 1
+                await self._reject(send, 503, "Server busy, try again shortly", self.queue_timeout)
+                return
+            self._queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected["queue_timeout"] += 1
+                await self._reject(send, 503, "Server busy, try again shortly", self.queue_timeout)
+                return
+            finally:
+                self._queued -= 1
+        else:
+            await self._slots.acquire()
+
+        try:
+            await self._run(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _run(self, scope, receive, send):
+        if self.deadline <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        token = _deadline.set(time.monotonic() + self.deadline)
+        started = False
+
+        async def send_wrapper(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await asyncio.wait_for(self.app(scope, receive, send_wrapper), self.deadline + self.deadline_grace)
+        except asyncio.TimeoutError:
+            self.rejected["deadline"] += 1
+            if not started:
+                await self._reject(send, 503, "Request deadline exceeded", 1)
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,176 @@
+"""
+Local stand-in for the Radio Browser API.
+
+Serves the subset of endpoints RadioBrowserService uses from a deterministic,
+generated catalog, with configurable latency and error injection so load
+profiles can be run without touching the real upstream.
+"""
+
+import asyncio
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from fastapi import FastAPI, HTTPException
+
+COUNTRIES = [
+    ('US', 'United States'), ('GB', 'United Kingdom'), ('DE', 'Germany'),
+    ('FR', 'France'), ('CA', 'Canada'), ('AU', 'Australia'), ('IT', 'Italy'),
+    ('ES', 'Spain'), ('NL', 'Netherlands'), ('BR', 'Brazil'), ('JP', 'Japan'),
+    ('IN', 'India'), ('MX', 'Mexico'), ('PL', 'Poland'), ('SE', 'Sweden'),
+    ('NO', 'Norway'), ('CH', 'Switzerland'), ('AT', 'Austria'), ('BE', 'Belgium'),
+    ('PT', 'Portugal'), ('GR', 'Greece'), ('TR', 'Turkey'), ('AR', 'Argentina'),
+    ('RU', 'Russia'), ('ZA', 'South Africa'), ('NZ', 'New Zealand'),
+    ('IE', 'Ireland'), ('DK', 'Denmark'), ('FI', 'Finland'), ('CZ', 'Czechia'),
+]
+
+# Rough centre points used to scatter generated station coordinates
+COUNTRY_CENTRES = {
+    'US': (39.8, -98.6), 'GB': (54.0, -2.0), 'DE': (51.2, 10.4), 'FR': (46.6, 2.2),
+    'CA': (56.1, -106.3), 'AU': (-25.3, 133.8), 'IT': (42.8, 12.6), 'ES': (40.4, -3.7),
+    'NL': (52.1, 5.3), 'BR': (-14.2, -51.9), 'JP': (36.2, 138.3), 'IN': (20.6, 79.0),
+    'MX': (23.6, -102.6), 'PL': (51.9, 19.1), 'SE': (60.1, 18.6), 'NO': (60.5, 8.5),
+    'CH': (46.8, 8.2), 'AT': (47.5, 14.6), 'BE': (50.5, 4.5), 'PT': (39.4, -8.2),
+    'GR': (39.1, 21.8), 'TR': (38.9, 35.2), 'AR': (-38.4, -63.6), 'RU': (61.5, 105.3),
+    'ZA': (-30.6, 22.9), 'NZ': (-40.9, 174.9), 'IE': (53.4, -8.2), 'DK': (56.3, 9.5),
+    'FI': (61.9, 25.7), 'CZ': (49.8, 15.5),
+}
+
+TAGS = [
+    'news', 'talk', 'pop', 'rock', 'classical', 'jazz', 'country', 'hip hop',
+    'electronic', 'dance', 'folk', 'alternative', 'indie', 'metal', 'punk',
+    'reggae', 'blues', 'oldies', 'world', 'latin', 'christian', 'sports',
+    'variety', 'public radio', 'community', 'chill', 'lounge', '80s', '90s',
+    'top 40', 'hits', 'ambient', 'soul', 'funk', 'house', 'techno',
+]
+
+LANGUAGES = [
+    'english', 'german', 'french', 'spanish', 'italian', 'dutch', 'portuguese',
+    'japanese', 'hindi', 'polish', 'swedish', 'norwegian', 'russian', 'greek',
+]
+
+CODECS = [('MP3', 0.6), ('AAC', 0.25), ('AAC+', 0.1), ('OGG', 0.05)]
+BITRATES = [32, 64, 96, 128, 128, 128, 192, 256, 320]
+
+
+@dataclass
+class FakeUpstreamConfig:
+    """Behaviour knobs for the fake upstream"""
+    stations_per_country: int = 500
+    latency_ms: float = 50.0
+    latency_jitter_ms: float = 10.0
+    error_rate: float = 0.0
+    # Fraction of stations that are also listed again as near-duplicates
+    duplicate_rate: float = 0.0
+    seed: int = 42
+
+
+@dataclass
+class FakeUpstreamStats:
+    """Counters describing what the fake upstream actually served"""
+    requests: int = 0
+    errors: int = 0
+    by_path: Dict[str, int] = field(default_factory=dict)
+
+    def record(self, path: str):
+        self.requests += 1
+        self.by_path[path] = self.by_path.get(path, 0) + 1
+
+
+def near_duplicates(station: dict, rng: random.Random) -> List[dict]:
+    """Extra listings of `station` as they show up in Radio Browser: an https
+    copy of the same stream, and other bitrates or codecs under a tweaked name"""
+    copies = []
+    for _ in range(rng.randint(1, 3)):
+        copy = dict(station, stationuuid=str(uuid.UUID(int=rng.getrandbits(128))),
+                    clickcount=rng.randint(0, station["clickcount"]), votes=rng.randint(0, 100))
+        kind = rng.random()
+        if kind < 0.3:
+            copy["url"] = station["url"].replace("http://", "https://") + "/"
+        else:
+            bitrate = rng.choice([b for b in (32, 64, 96, 192, 320) if b != station["bitrate"]])
+            codec = rng.choice(["AAC", "MP3", "OGG"])
+            copy.update(bitrate=bitrate, codec=codec, url=f"{station['url']}-{bitrate}.{codec.lower()}")
+            copy["name"] = rng.choice([
+                f"{station['name']} ({bitrate}k)",
+                f"{station['name']} - {codec}",
+                f"{station['name'].upper()} {codec} {bitrate}kbps",
+                station["name"].replace("Radio", "Radi0" if kind < 0.5 else "Radio") + " HQ",
+            ])
+        copies.append(copy)
+    return copies
+
+
+def generate_catalog(config: FakeUpstreamConfig) -> Dict[str, List[dict]]:
+    """Generate a deterministic station catalog keyed by country code"""
+    rng = random.Random(config.seed)
+    # Separate stream so enabling duplicates leaves the base catalog unchanged
+    duplicate_rng = random.Random(config.seed + 2)
+    codecs, weights = zip(*CODECS)
+    catalog = {}
+    for code, name in COUNTRIES:
+        lat0, lon0 = COUNTRY_CENTRES[code]
+        stations = []
+        for i in range(config.stations_per_country):
+            tags = rng.sample(TAGS, rng.randint(0, 4))
+            stations.append({
+                "stationuuid": str(uuid.UUID(int=rng.getrandbits(128))),
+                "name": f"{name} Radio {i + 1}",
+                "url": f"http://stream{i % 7}.example.{code.lower()}/live/{i}",
+                "homepage": f"https://radio{i}.example.{code.lower()}/",
+                "favicon": f"https://radio{i}.example.{code.lower()}/favicon.ico",
+                "country": name,
+                "countrycode": code,
+                "state": None,
+                "language": rng.choice(LANGUAGES),
+                "tags": ",".join(tags),
+                "codec": rng.choices(codecs, weights)[0],
+                "bitrate": rng.choice(BITRATES),
+                "votes": rng.randint(0, 5000),
+                "clickcount": int(rng.paretovariate(1.2) * 10),
+                "lastcheckok": 1,
+                "geo_lat": round(lat0 + rng.uniform(-4, 4), 5),
+                "geo_long": round(lon0 + rng.uniform(-6, 6), 5),
+            })
+            if config.duplicate_rate and duplicate_rng.random() < config.duplicate_rate:
+                stations.extend(near_duplicates(stations[-1], duplicate_rng))
+        stations.sort(key=lambda s: s["clickcount"], reverse=True)
+        catalog[code] = stations
+    return catalog
+
+
+def create_fake_radio_browser(config: FakeUpstreamConfig, stats: FakeUpstreamStats) -> FastAPI:
+    """Build an ASGI app that mimics the Radio Browser JSON API"""
+    app = FastAPI(title="Fake Radio Browser")
+    catalog = generate_catalog(config)
+    rng = random.Random(config.seed + 1)
+
+    async def simulate(path: str):
+        stats.record(path)
+        delay = max(0.0, rng.gauss(config.latency_ms, config.latency_jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        if config.error_rate and rng.random() < config.error_rate:
+            stats.errors += 1
+            raise HTTPException(status_code=503, detail="Injected upstream failure")
+
+    @app.get("/json/countries")
+    async def countries():
+        await simulate("countries")
+        return [
+            {"name": name, "iso_3166_1": code, "stationcount": len(catalog[code])}
+            for code, name in COUNTRIES
+        ]
+
+    @app.get("/json/stations/bycountrycodeexact/{country_code}")
+    async def stations_by_country(country_code: str, limit: int = 100000, offset: int = 0):
+        await simulate("stations_by_country")
+        return catalog.get(country_code.upper(), [])[offset:offset + limit]
+
+    @app.get("/json/stations/search")
+    async def search_stations(limit: int = 100000, offset: int = 0):
+        await simulate("stations_search")
+        everything = [s for stations in catalog.values() for s in stations]
+        return everything[offset:offset + limit]
+
+    return app
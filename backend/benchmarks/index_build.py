@@ -0,0 +1,92 @@
+"""
+Offline build benchmarks for the indexes derived from the station catalog.
+"""
+
+import math
+import random
+import time
+from typing import List
+
+from benchmarks.fake_radio_browser import COUNTRIES, TAGS, FakeUpstreamConfig, generate_catalog
+from models import RadioBrowserStation, RadioStation
+from services.radio_service import RadioBrowserService
+from services.similarity_index import SimilarityIndex
+from services.station_dedup import StationDeduplicator
+
+
+def build_stations(total: int, seed: int, duplicate_rate: float = 0.0) -> List[RadioStation]:
+    """Generate `total` transformed stations spread across the fake countries"""
+    config = FakeUpstreamConfig(stations_per_country=math.ceil(total / len(COUNTRIES)), seed=seed,
+                                duplicate_rate=duplicate_rate)
+    catalog = generate_catalog(config)
+    raw = [item for stations in catalog.values() for item in stations][:total]
+    return [RadioBrowserService._transform_station(RadioBrowserStation(**item)) for item in raw]
+
+
+def bench_similarity_build(total: int, seed: int, churn: float = 0.01) -> dict:
+    """Time a full similarity build and an incremental update touching `churn` of the catalog"""
+    stations = build_stations(total, seed)
+    index = SimilarityIndex()
+
+    index.apply(stations, [])
+    start = time.perf_counter()
+    index.refresh()
+    full_build = time.perf_counter() - start
+
+    rng = random.Random(seed)
+    changed = [
+        station.model_copy(update={"tags": ",".join(rng.sample(TAGS, 3))})
+        for station in rng.sample(stations, max(1, int(total * churn)))
+    ]
+    index.apply(changed, [])
+    start = time.perf_counter()
+    rescored = index.refresh()
+    incremental = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for station in stations[:1000]:
+        index.get(station.id, 10)
+    lookup_us = (time.perf_counter() - start) / 1000 * 1e6
+
+    return {
+        "stations": len(stations),
+        "top_k": index.top_k,
+        "full_build_s": round(full_build, 3),
+        "incremental_changed": len(changed),
+        "incremental_rescored": rescored,
+        "incremental_update_s": round(incremental, 3),
+        "lookup_us": round(lookup_us, 3),
+    }
+
+
+def bench_dedup(total: int, seed: int, duplicate_rate: float = 0.2) -> dict:
+    """Time collapsing near-duplicate listings and measure what it saves.
+
+    `total` distinct stations are generated, a `duplicate_rate` share of them
+    with one to three extra listings as in Radio Browser.
+    """
+    config = FakeUpstreamConfig(stations_per_country=math.ceil(total / len(COUNTRIES)), seed=seed,
+                                duplicate_rate=duplicate_rate)
+    catalog = generate_catalog(config)
+    stations = [
+        RadioBrowserService._transform_station(RadioBrowserStation(**item))
+        for listings in catalog.values() for item in listings
+    ]
+
+    start = time.perf_counter()
+    deduped, _, report = StationDeduplicator().dedupe(stations)
+    elapsed = time.perf_counter() - start
+
+    # The country endpoint serves at most 100 stations
+    top_before = {code: [s for s in stations if s.countrycode == code][:100] for code, _ in COUNTRIES}
+    duplicated_slots = sum(len(top) - len(StationDeduplicator().dedupe(top)[0]) for top in top_before.values())
+
+    return {
+        **report.summary(),
+        "distinct_stations": len(COUNTRIES) * config.stations_per_country,
+        "dedupe_s": round(elapsed, 3),
+        "per_station_us": round(elapsed / len(stations) * 1e6, 3),
+        "catalog_bytes_before": sum(len(s.model_dump_json()) for s in stations),
+        "catalog_bytes_after": sum(len(s.model_dump_json()) for s in deduped),
+        "duplicate_slots_in_top_100": duplicated_slots,
+    }
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Offline load-testing and benchmark suite for Global Radio API.
+
+Starts the FastAPI app in-process against a local Radio Browser stand-in and
+runs concurrent load profiles, reporting throughput and latency percentiles.
+Results are written as JSON so runs can be compared between commits.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --compare bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.fake_radio_browser import (  # noqa: E402
+    COUNTRIES, COUNTRY_CENTRES, FakeUpstreamConfig, FakeUpstreamStats, create_fake_radio_browser,
+)
+
+FAKE_UPSTREAM_URL = "http://fake-radio-browser/json"
+
+# A request is a (path, params) pair issued against the API under test
+Request = Tuple[str, Dict[str, str]]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+class BenchmarkRunner:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.upstream_config = FakeUpstreamConfig(
+            stations_per_country=args.stations_per_country,
+            latency_ms=args.latency_ms,
+            latency_jitter_ms=args.jitter_ms,
+            error_rate=args.error_rate,
+            duplicate_rate=args.duplicate_rate,
+            seed=args.seed,
+        )
+        self.upstream_stats = FakeUpstreamStats()
+        self.rng = random.Random(args.seed)
+
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", "benchmark_database")
+        # Every simulated request comes from one in-process client
+        os.environ.setdefault("RATE_LIMIT_PER_SECOND", "0")
+        import server
+
+        # Per-request httpx logging would dominate the measurements
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+        self.server = server
+        self.app = server.app
+        self.service = server.radio_service
+        self.client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.app), base_url="http://bench", timeout=60.0
+        )
+
+    async def setup(self):
+        """Serve the app from a service talking to the fake upstream"""
+        from services.radio_service import RadioBrowserService
+
+        fake = create_fake_radio_browser(self.upstream_config, self.upstream_stats)
+        await self.service.close()
+        self.service = RadioBrowserService(
+            base_url=FAKE_UPSTREAM_URL,
+            client=httpx.AsyncClient(transport=httpx.ASGITransport(app=fake), timeout=30.0),
+        )
+        # Routes look the service up as a module global on each request
+        self.server.radio_service = self.service
+        # Index-backed endpoints are served from the catalog, load it up front
+        await self.service.refresh_catalog()
+
+    async def close(self):
+        await self.client.aclose()
+        await self.service.close()
+
+    def reset_cache(self):
+        # Stale copies would be served straight away, so clear them too to measure real misses
+        self.service.cache.clear()
+        self.service.stale_cache.clear()
+
+    # Load profiles ---------------------------------------------------------
+
+    def profile_cold_cache(self) -> List[Request]:
+        """Every request misses the cache: distinct (country, limit) keys"""
+        keys = [(code, limit) for limit in range(1, 101) for code, _ in COUNTRIES]
+        self.rng.shuffle(keys)
+        return [
+            (f"/api/stations/{code}", {"limit": str(limit)})
+            for code, limit in keys[:self.args.requests]
+        ]
+
+    def profile_hot_cache(self) -> List[Request]:
+        """Every request hits the same, already cached key"""
+        return [("/api/stations/US", {"limit": "50"})] * self.args.requests
+
+    def profile_stampede(self) -> List[Request]:
+        """A burst on one key right after it expired"""
+        return [("/api/stations/DE", {"limit": "50"})] * self.args.requests
+
+    def profile_mixed_countries(self) -> List[Request]:
+        """Realistic browsing: many countries, a few page sizes, some country lists"""
+        requests = []
+        for _ in range(self.args.requests):
+            if self.rng.random() < 0.05:
+                requests.append(("/api/countries", {}))
+            else:
+                code, _ = self.rng.choice(COUNTRIES)
+                limit = self.rng.choice([20, 50, 50, 100])
+                requests.append((f"/api/stations/{code}", {"limit": str(limit)}))
+        return requests
+
+    def profile_nearby(self) -> List[Request]:
+        """Location lookups served from the geo index"""
+        requests = []
+        for _ in range(self.args.requests):
+            lat, lon = COUNTRY_CENTRES[self.rng.choice(COUNTRIES)[0]]
+            params = {
+                "lat": f"{lat + self.rng.uniform(-3, 3):.4f}",
+                "lon": f"{lon + self.rng.uniform(-3, 3):.4f}",
+                "radius": str(self.rng.choice([25, 100, 500])),
+                "limit": "20",
+            }
+            requests.append(("/api/stations/nearby", params))
+        return requests
+
+    def profile_payload(self, fields: Optional[str] = None) -> Callable[[], List[Request]]:
+        """A cached 100-station list, optionally projected to a sparse fieldset"""
+        params = {"limit": "100"}
+        if fields:
+            params["fields"] = fields
+        return lambda: [("/api/stations/GB", params)] * self.args.requests
+
+    async def warm(self, requests: List[Request], headers: Dict[str, str]):
+        for path, params in dict.fromkeys((p, tuple(q.items())) for p, q in requests):
+            await self.client.get(path, params=dict(params), headers=headers)
+
+    def profiles(self) -> Dict[str, Tuple[Callable[[], List[Request]], bool, Dict[str, str]]]:
+        """name -> (request generator, warm cache first, request headers)"""
+        list_fields = "id,name,genre,favicon"
+        msgpack = {"Accept": "application/msgpack"}
+        return {
+            "cold_cache": (self.profile_cold_cache, False, {}),
+            "hot_cache": (self.profile_hot_cache, True, {}),
+            "stampede": (self.profile_stampede, False, {}),
+            "mixed_countries": (self.profile_mixed_countries, False, {}),
+            "nearby": (self.profile_nearby, False, {}),
+            "payload_json": (self.profile_payload(), True, {}),
+            "payload_fields_json": (self.profile_payload(list_fields), True, {}),
+            "payload_msgpack": (self.profile_payload(), True, msgpack),
+            "payload_fields_msgpack": (self.profile_payload(list_fields), True, msgpack),
+        }
+
+    # Execution -------------------------------------------------------------
+
+    async def run_profile(self, name: str, requests: List[Request], warm: bool,
+                          headers: Dict[str, str]) -> dict:
+        self.reset_cache()
+        if warm:
+            await self.warm(requests, headers)
+        upstream_before = self.upstream_stats.requests
+        upstream_errors_before = self.upstream_stats.errors
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for request in requests:
+            queue.put_nowait(request)
+        latencies: List[float] = []
+        statuses: Dict[str, int] = {}
+        payload_bytes = 0
+        # The stampede profile fires everything at once, the rest use a worker pool
+        concurrency = len(requests) if name == "stampede" else self.args.concurrency
+
+        async def worker():
+            nonlocal payload_bytes
+            while True:
+                try:
+                    path, params = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                try:
+                    response = await self.client.get(path, params=params, headers=headers)
+                    status = str(response.status_code)
+                    payload_bytes += len(response.content)
+                except Exception as e:
+                    status = type(e).__name__
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        cpu_started = time.process_time()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        # Client and fake upstream run in-process too, compare across profiles rather than absolutely
+        cpu = time.process_time() - cpu_started
+
+        latencies.sort()
+        return {
+            "requests": len(requests),
+            "concurrency": concurrency,
+            "duration_s": round(elapsed, 4),
+            "throughput_rps": round(len(requests) / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+            "status_counts": statuses,
+            "payload_bytes": payload_bytes,
+            "bytes_per_request": round(payload_bytes / len(requests)) if requests else 0,
+            "cpu_ms_per_request": round(cpu * 1000 / len(requests), 4) if requests else 0.0,
+            "upstream_requests": self.upstream_stats.requests - upstream_before,
+            "upstream_errors": self.upstream_stats.errors - upstream_errors_before,
+        }
+
+    async def run(self) -> dict:
+        await self.setup()
+        available = self.profiles()
+        selected = self.args.profiles or list(available)
+        results = {}
+        for name in selected:
+            if name not in available:
+                raise SystemExit(f"Unknown profile '{name}', choose from {', '.join(available)}")
+            generator, warm, headers = available[name]
+            print(f"▶ {name}")
+            results[name] = await self.run_profile(name, generator(), warm, headers)
+            self.print_profile(name, results[name])
+
+        builds = {}
+        if self.args.similarity_stations:
+            from benchmarks.index_build import bench_similarity_build
+            print(f"▶ similarity_build ({self.args.similarity_stations} stations)")
+            builds["similarity"] = bench_similarity_build(self.args.similarity_stations, self.args.seed)
+            print(f"    {builds['similarity']}")
+        if self.args.dedup_stations:
+            from benchmarks.index_build import bench_dedup
+            print(f"▶ dedup ({self.args.dedup_stations} stations)")
+            builds["dedup"] = bench_dedup(self.args.dedup_stations, self.args.seed)
+            print(f"    {builds['dedup']}")
+
+        return {
+            "metadata": {
+                "timestamp": datetime.now().isoformat(),
+                "git_revision": git_revision(),
+                "python": sys.version.split()[0],
+                "upstream": self.upstream_config.__dict__,
+                "requests_per_profile": self.args.requests,
+                "concurrency": self.args.concurrency,
+            },
+            "profiles": results,
+            "builds": builds,
+        }
+
+    @staticmethod
+    def print_profile(name: str, result: dict):
+        lat = result["latency_ms"]
+        print(
+            f"    {result['throughput_rps']:>10.1f} req/s   "
+            f"p50 {lat['p50']:.2f}ms  p95 {lat['p95']:.2f}ms  p99 {lat['p99']:.2f}ms   "
+            f"{result['bytes_per_request']} B/req  {result['cpu_ms_per_request']:.3f} cpu-ms/req   "
+            f"upstream calls {result['upstream_requests']}   statuses {result['status_counts']}"
+        )
+
+
+def compare(current: dict, baseline_path: str):
+    """Print per-profile deltas against a previous results file"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+
+    print("=" * 60)
+    print(f"📊 COMPARISON against {baseline_path} ({baseline['metadata'].get('git_revision')})")
+    print("=" * 60)
+    for name, result in current["profiles"].items():
+        before = baseline["profiles"].get(name)
+        if not before:
+            continue
+        print(name)
+        pairs = [("throughput_rps", before["throughput_rps"], result["throughput_rps"])]
+        pairs += [
+            (f"{key}_ms", before["latency_ms"][key], result["latency_ms"][key])
+            for key in ("p50", "p95", "p99")
+        ]
+        for key in ("bytes_per_request", "cpu_ms_per_request"):
+            if key in before:
+                pairs.append((key, before[key], result[key]))
+        for label, old, new in pairs:
+            change = ((new - old) / old * 100) if old else 0.0
+            print(f"    {label:<15} {old:>10.2f} → {new:>10.2f}  ({change:+.1f}%)")
+
+    for name, result in current.get("builds", {}).items():
+        before = baseline.get("builds", {}).get(name)
+        if not before:
+            continue
+        print(f"{name} build")
+        for label, new in result.items():
+            old = before.get(label)
+            if label.endswith("_s") or label.endswith("_us"):
+                change = ((new - old) / old * 100) if old else 0.0
+                print(f"    {label:<22} {old:>10.3f} → {new:>10.3f}  ({change:+.1f}%)")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite for Global Radio API")
+    parser.add_argument("--profiles", nargs="*", help="Profiles to run (default: all)")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per profile")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent clients")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Mean fake upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Fake upstream latency std dev")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of upstream calls that fail")
+    parser.add_argument("--stations-per-country", type=int, default=500, help="Fake catalog size per country")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="Fraction of fake stations that are also listed as near-duplicates")
+    parser.add_argument("--similarity-stations", type=int, default=50000,
+                        help="Catalog size for the similarity index build benchmark (0 to skip)")
+    parser.add_argument("--dedup-stations", type=int, default=50000,
+                        help="Distinct stations for the duplicate collapsing benchmark (0 to skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write JSON results")
+    parser.add_argument("--compare", help="Previous results file to compare against")
+    return parser.parse_args(argv)
+
+
+async def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    runner = BenchmarkRunner(args)
+    try:
+        results = await runner.run()
+    finally:
+        await runner.close()
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"📄 Results saved to: {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
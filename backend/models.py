@@ -8,6 +8,13 @@ class Country(BaseModel):
     flag: str
     station_count: int = 0
 
+class StationVariant(BaseModel):
+    """One bitrate/codec option of a station listed several times upstream"""
+    id: str
+    url: str
+    bitrate: Optional[int] = None
+    codec: Optional[str] = None
+
 class RadioStation(BaseModel):
     id: str
     name: str
@@ -21,11 +28,24 @@ class RadioStation(BaseModel):
     country: str
     countrycode: str
     language: Optional[str] = None
+    tags: Optional[str] = None
     bitrate: Optional[int] = None
     codec: Optional[str] = None
     votes: int = 0
     clickcount: int = 0
     lastcheckok: int = 0
+    geo_lat: Optional[float] = None
+    geo_long: Optional[float] = None
+    variants: List[StationVariant] = []
+
+class NearbyStation(RadioStation):
+    distance_km: float
+
+class SimilarStation(RadioStation):
+    similarity: float
+
+class TrendingStation(RadioStation):
+    plays: int
 
 class RadioBrowserStation(BaseModel):
     """Raw station data from Radio Browser API"""
@@ -44,6 +64,8 @@ class RadioBrowserStation(BaseModel):
     votes: int = 0
     clickcount: int = 0
     lastcheckok: int = 0
+    geo_lat: Optional[float] = None
+    geo_long: Optional[float] = None
 
 class RadioBrowserCountry(BaseModel):
     """Raw country data from Radio Browser API"""
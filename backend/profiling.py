@@ -0,0 +1,289 @@
+"""
+Opt-in request profiling for production debugging.
+
+A request is profiled when it carries `X-Profile: 1` together with a valid
+`X-Admin-Token`, or when it is picked by `PROFILE_SAMPLE_RATE`. Profiled
+requests record span timings (cache lookup, upstream fetch, validation,
+transform, serialization) and stack samples of the event loop thread, and
+are kept in memory for the admin endpoints. Unprofiled requests only pay for
+a context variable lookup per span.
+"""
+
+import asyncio
+import functools
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set
+
+from fastapi.routing import APIRoute
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+_NO_SPAN = nullcontext()
+
+
+class RequestProfile:
+    """Timings and stack samples collected for one request"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.started_at = datetime.utcnow()
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+
+        self._start = time.perf_counter()
+        self._stack: List[str] = []
+        # Span path ("endpoint;upstream_fetch") -> accumulated seconds
+        self.spans: Dict[str, float] = {}
+        self.samples: Counter = Counter()
+
+    @property
+    def root(self) -> str:
+        return f"{self.method} {self.route or self.path}"
+
+    @contextmanager
+    def span(self, name: str):
+        self._stack.append(name)
+        path = ";".join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(path, time.perf_counter() - start)
+            self._stack.pop()
+
+    def add_span(self, path: str, seconds: float):
+        self.spans[path] = self.spans.get(path, 0.0) + seconds
+
+    def record(self, name: str, seconds: float):
+        """Add time measured elsewhere as a child of the currently open span"""
+        self.add_span(";".join(self._stack + [name]), seconds)
+
+    def finish(self, status: Optional[int]):
+        self.status = status
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def server_timing(self) -> str:
+        """Top-level spans as a Server-Timing header value"""
+        return ", ".join(
+            f"{path};dur={seconds * 1000:.2f}"
+            for path, seconds in self.spans.items() if ";" not in path
+        )
+
+    def folded(self, source: str = "spans") -> List[str]:
+        """Flamegraph-compatible folded stacks ("a;b;c value")"""
+        if source == "samples":
+            return [f"{self.root};{stack} {count}" for stack, count in self.samples.most_common()]
+
+        lines = []
+        for path, seconds in self.spans.items():
+            children = sum(
+                child_seconds for child, child_seconds in self.spans.items()
+                if child.startswith(path + ";") and child.count(";") == path.count(";") + 1
+            )
+            self_us = int(round((seconds - children) * 1e6))
+            if self_us > 0:
+                lines.append(f"{self.root};{path} {self_us}")
+        if self.duration_ms is not None:
+            top_level = sum(s for p, s in self.spans.items() if ";" not in p)
+            rest_us = int(round(self.duration_ms * 1000 - top_level * 1e6))
+            if rest_us > 0:
+                lines.append(f"{self.root} {rest_us}")
+        return lines
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "route": self.root,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            "spans_ms": {path: round(seconds * 1000, 3) for path, seconds in self.spans.items()},
+            "samples": sum(self.samples.values()),
+        }
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def span(name: str):
+    """Time a block as part of the current request's profile, if any"""
+    profile = _current_profile.get()
+    if profile is None:
+        return _NO_SPAN
+    return profile.span(name)
+
+
+class StackSampler:
+    """Samples the event loop thread's stack while profiled requests are in flight"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self._active: Set[RequestProfile] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._target: Optional[int] = None
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._active.add(profile)
+            self._target = threading.get_ident()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = self._fold(frame)
+            # Samples cover the whole loop thread, so overlapping profiled requests share them
+            for profile in active:
+                profile.samples[stack] += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+class ProfileStore:
+    """Keeps the most recent request profiles for the admin endpoints"""
+
+    def __init__(self, maxlen: int = 200):
+        self.profiles: Deque[RequestProfile] = deque(maxlen=maxlen)
+
+    def add(self, profile: RequestProfile):
+        self.profiles.append(profile)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        for profile in self.profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+    def clear(self):
+        self.profiles.clear()
+
+    def folded(self, source: str = "spans", route: Optional[str] = None) -> str:
+        """All stored profiles merged into one folded-stack document"""
+        totals: Counter = Counter()
+        for profile in list(self.profiles):
+            if route and profile.route != route:
+                continue
+            for line in profile.folded(source):
+                stack, value = line.rsplit(" ", 1)
+                totals[stack] += int(value)
+        return "\n".join(f"{stack} {value}" for stack, value in totals.items()) + "\n"
+
+
+profile_store = ProfileStore()
+stack_sampler = StackSampler()
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that decides which requests get profiled"""
+
+    def __init__(self, app, sample_rate: float = 0.0, admin_token: Optional[str] = None,
+                 store: ProfileStore = profile_store, sampler: StackSampler = stack_sampler):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.store = store
+        self.sampler = sampler
+
+    def _wants_profile(self, scope) -> bool:
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        if not self.admin_token:
+            return False
+        headers = dict(scope.get("headers") or [])
+        return headers.get(b"x-profile") == b"1" and secrets.compare_digest(
+            headers.get(b"x-admin-token", b""), self.admin_token.encode()
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current_profile.set(profile)
+        self.sampler.add(profile)
+        status = None
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if profile.endpoint_finished is not None:
+                    profile.add_span("serialize", time.perf_counter() - profile.endpoint_finished)
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                headers.append((b"server-timing", profile.server_timing().encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.sampler.remove(profile)
+            profile.finish(status)
+            _current_profile.reset(token)
+            self.store.add(profile)
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that names the profile after the route and times the endpoint separately
+    from response serialization"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        endpoint = self.dependant.call
+        route = self.path_format
+        # Sync endpoints run in a threadpool, outside the request's context
+        if not asyncio.iscoroutinefunction(endpoint):
+            return
+
+        @functools.wraps(endpoint)
+        async def profiled_endpoint(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            profile.route = route
+            try:
+                with profile.span("endpoint"):
+                    return await endpoint(*args, **kwargs)
+            finally:
+                profile.endpoint_finished = time.perf_counter()
+
+        self.dependant.call = profiled_endpoint
@@ -0,0 +1,141 @@
+"""
+Sparse fieldsets and content negotiation for station payloads.
+
+`fields=id,name,genre` projects each station down to the requested fields
+before anything is serialized, and `Accept: application/msgpack` switches the
+encoding from JSON to MessagePack when it is preferred over JSON. Requests
+that ask for neither are left to FastAPI's regular response_model path. Every
+response carries `Vary: Accept`, since the same URL serves both encodings.
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+import msgpack
+from cachetools import TTLCache
+from fastapi import HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from profiling import span
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma separated `fields` parameter against a response model"""
+    if fields is None:
+        return None
+
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(',') if f.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    unknown = [f for f in requested if f not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+def parse_accept(accept: str) -> Dict[str, float]:
+    """Media ranges of an Accept header with their q-values"""
+    ranges: Dict[str, float] = {}
+    for part in accept.split(','):
+        media_type, *params = part.split(';')
+        media_type = media_type.strip().lower()
+        if not media_type:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    quality = 0.0
+        ranges[media_type] = max(quality, ranges.get(media_type, 0.0))
+    return ranges
+
+
+def _quality(ranges: Dict[str, float], media_type: str) -> float:
+    # The most specific matching range decides
+    for candidate in (media_type, media_type.split('/')[0] + '/*', '*/*'):
+        if candidate in ranges:
+            return ranges[candidate]
+    return 0.0
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """MessagePack only when named explicitly and not ranked below JSON"""
+    if not accept:
+        return False
+    ranges = parse_accept(accept)
+    quality = max(ranges.get(media_type, 0.0) for media_type in MSGPACK_MEDIA_TYPES)
+    return quality > 0 and quality >= _quality(ranges, "application/json")
+
+
+class EncodedResponseCache:
+    """Caches encoded payloads for a given list of stations.
+
+    Entries remember the station list they were built from and only match
+    while the caller passes that same list object, so a refresh of the
+    underlying cache invalidates them without any bookkeeping.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: int = 3600):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: tuple, source: list) -> Optional[bytes]:
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] is source:
+            return entry[1]
+        return None
+
+    def put(self, key: tuple, source: list, body: bytes):
+        self.cache[key] = (source, body)
+
+
+encoded_cache = EncodedResponseCache()
+
+
+def encode_stations(stations: List[BaseModel], fields: Optional[Tuple[str, ...]], msgpack_body: bool) -> bytes:
+    with span("project"):
+        if fields is None:
+            rows: List[Dict] = [station.model_dump() for station in stations]
+        else:
+            rows = [{f: getattr(station, f) for f in fields} for station in stations]
+            # Lists of nested models (variants) still need dumping
+            for f in [f for f in fields if rows and isinstance(rows[0][f], list)]:
+                for row in rows:
+                    row[f] = [item.model_dump() for item in row[f]]
+    with span("encode"):
+        if msgpack_body:
+            return msgpack.packb(rows, use_bin_type=True)
+        # Same settings as FastAPI's JSONResponse
+        return json.dumps(rows, ensure_ascii=False, allow_nan=False, indent=None,
+                          separators=(",", ":")).encode("utf-8")
+
+
+def render_stations(stations: List[BaseModel], model: Type[BaseModel], fields: Optional[str],
+                    accept: Optional[str], response: Response,
+                    cache_key: Optional[tuple] = None) -> Union[List[BaseModel], Response]:
+    """Return stations as-is, or as a projected and/or msgpack-encoded Response.
+
+    `response` is the endpoint's injected Response, which FastAPI merges into
+    the response_model path so plain JSON answers carry `Vary` too.
+    """
+    selected = parse_fields(fields, model)
+    use_msgpack = wants_msgpack(accept)
+    if selected is None and not use_msgpack:
+        response.headers["Vary"] = "Accept"
+        return stations
+
+    media_type = MSGPACK_MEDIA_TYPES[0] if use_msgpack else "application/json"
+    body = None
+    if cache_key is not None:
+        key = (cache_key, selected, media_type)
+        body = encoded_cache.get(key, stations)
+    if body is None:
+        body = encode_stations(stations, selected, use_msgpack)
+        if cache_key is not None:
+            encoded_cache.put(key, stations, body)
+    return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
@@ -1,17 +1,25 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Header
+from fastapi.responses import PlainTextResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
+import math
+import secrets
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Optional
 import uuid
 from datetime import datetime
 
-from models import Country, RadioStation
+from models import Country, RadioStation, NearbyStation, SimilarStation, TrendingStation
 from services.radio_service import radio_service
+from services.play_tracker import PlayTracker
+from profiling import ProfiledRoute, ProfilingMiddleware, profile_store
+from serialization import render_stations
+from admission import AdmissionControlMiddleware
+from services.facet_index import BITRATE_BUCKETS
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,11 +29,17 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Local play counts, flushed to MongoDB in batches
+play_tracker = PlayTracker(db.station_plays)
+
 # Create the main app without a prefix
 app = FastAPI(title="Global Radio API", version="1.0.0")
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=ProfiledRoute)
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
 
 # Define Models for existing endpoints
 class StatusCheck(BaseModel):
@@ -64,8 +78,100 @@ async def get_countries():
         logging.error(f"Failed to get countries: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch countries")
 
+@api_router.get("/facets")
+async def get_facets(country: Optional[str] = None, genre: Optional[str] = None,
+                     language: Optional[str] = None, codec: Optional[str] = None,
+                     bitrate: Optional[str] = None, limit: int = 50):
+    """Get station counts per genre, language, codec, bitrate bucket and country.
+
+    Each filter takes comma separated values, matched case-insensitively;
+    counts honour every filter except the facet's own.
+    """
+    def split(value: Optional[str]) -> List[str]:
+        return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+    filters = {
+        "country": split(country),
+        "genre": split(genre),
+        "language": split(language),
+        "codec": split(codec),
+        "bitrate": split(bitrate),
+    }
+    unknown = [bucket for bucket in filters["bitrate"] if bucket.casefold() not in BITRATE_BUCKETS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Bitrate must be one of: {', '.join(BITRATE_BUCKETS)}"
+        )
+
+    if limit > 500:
+        limit = 500
+    elif limit < 1:
+        limit = 50
+
+    try:
+        body = radio_service.facet_index.query(filters, limit)
+    except Exception as e:
+        logging.error(f"Failed to compute facets: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch facets")
+    return Response(content=body, media_type="application/json")
+
+@api_router.get("/stations/nearby", response_model=List[NearbyStation])
+async def get_nearby_stations(response: Response, lat: float, lon: float, radius: float = 50,
+                              limit: int = 20, fields: Optional[str] = None,
+                              accept: Optional[str] = Header(None)):
+    """Get radio stations closest to a location (radius in km)"""
+    if not math.isfinite(lat) or not math.isfinite(lon) or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+        raise HTTPException(status_code=400, detail="Coordinates out of range")
+    if not math.isfinite(radius) or radius <= 0 or radius > 20000:
+        raise HTTPException(status_code=400, detail="Radius must be between 0 and 20000 km")
+
+    if limit > 100:
+        limit = 100
+    elif limit < 1:
+        limit = 20
+
+    try:
+        stations = radio_service.get_nearby_stations(lat, lon, radius, limit)
+    except Exception as e:
+        logging.error(f"Failed to get stations near {lat},{lon}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch nearby stations")
+    return render_stations(stations, NearbyStation, fields, accept, response)
+
+@api_router.get("/stations/trending", response_model=List[TrendingStation])
+async def get_trending_stations(response: Response, window: int = 60, limit: int = 20,
+                                fields: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """Get the stations our users played most over the last `window` minutes"""
+    if window < 1 or window * 60 > play_tracker.window_seconds:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window must be between 1 and {play_tracker.window_seconds // 60} minutes"
+        )
+
+    if limit > 100:
+        limit = 100
+    elif limit < 1:
+        limit = 20
+
+    try:
+        trending = []
+        # Stations dropped from the catalog still have plays, skip them before the cut to `limit`
+        ranking = play_tracker.trending(
+            window * 60, limit, include=lambda station_id: radio_service.catalog.get(station_id) is not None
+        )
+        for station_id, plays in ranking:
+            station = radio_service.catalog.get(station_id)
+            if station is not None:
+                trending.append(TrendingStation(**station.model_dump(), plays=plays))
+    except Exception as e:
+        logging.error(f"Failed to get trending stations: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch trending stations")
+    return render_stations(trending, TrendingStation, fields, accept, response)
+
 @api_router.get("/stations/{country_code}", response_model=List[RadioStation])
-async def get_stations_by_country(country_code: str, limit: int = 50):
+async def get_stations_by_country(response: Response, country_code: str, limit: int = 50,
+                                  sort: Optional[str] = None, fields: Optional[str] = None,
+                                  accept: Optional[str] = Header(None)):
     """Get radio stations for a specific country"""
     try:
         # Validate country code format
@@ -73,6 +179,9 @@ async def get_stations_by_country(country_code: str, limit: int = 50):
         if len(country_code) != 2:
             raise HTTPException(status_code=400, detail="Country code must be 2 characters")
         
+        if sort not in (None, "trending"):
+            raise HTTPException(status_code=400, detail="Sort must be 'trending'")
+        
         # Limit the number of stations returned
         if limit > 100:
             limit = 100
@@ -80,13 +189,47 @@ async def get_stations_by_country(country_code: str, limit: int = 50):
             limit = 50
         
         stations = await radio_service.get_stations_by_country(country_code, limit)
-        return stations
+        if sort == "trending":
+            stations = play_tracker.sort_by_trending(stations)
+            return render_stations(stations, RadioStation, fields, accept, response)
+        # Unsorted lists come straight from the service cache, so their encodings can be cached too
+        return render_stations(stations, RadioStation, fields, accept, response, cache_key=(country_code, limit))
     except HTTPException:
         raise
     except Exception as e:
         logging.error(f"Failed to get stations for {country_code}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch radio stations")
 
+@api_router.get("/stations/{station_id}/similar", response_model=List[SimilarStation])
+async def get_similar_stations(response: Response, station_id: str, limit: int = 10,
+                               fields: Optional[str] = None, accept: Optional[str] = Header(None)):
+    """Get stations similar to the given one by tags, language and genre"""
+    if limit > 20:
+        limit = 20
+    elif limit < 1:
+        limit = 10
+
+    try:
+        similar = radio_service.get_similar_stations(station_id, limit)
+    except Exception as e:
+        logging.error(f"Failed to get similar stations for {station_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch similar stations")
+
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Station not found")
+    return render_stations(similar, SimilarStation, fields, accept, response)
+
+@api_router.post("/stations/{station_id}/play")
+async def record_play(station_id: str):
+    """Count a play of a station by one of our users"""
+    station = radio_service.catalog.get(station_id)
+    if station is None:
+        raise HTTPException(status_code=404, detail="Station not found")
+
+    # Plays of a duplicate listing count towards its canonical station
+    play_tracker.record(station.id)
+    return {"station_id": station.id, "recorded": True}
+
 @api_router.get("/stations/{station_id}/validate")
 async def validate_station(station_id: str):
     """Validate if a radio station stream is working"""
@@ -102,9 +245,77 @@ async def validate_station(station_id: str):
         logging.error(f"Failed to validate station {station_id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to validate station")
 
+# Admin routes for on-demand profiling and ingestion stats
+def require_admin(token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@api_router.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List recently profiled requests, newest first"""
+    require_admin(x_admin_token)
+    return [profile.summary() for profile in reversed(profile_store.profiles)]
+
+@api_router.get("/admin/profiles/flamegraph", response_class=PlainTextResponse)
+async def get_profiles_flamegraph(source: str = "spans", route: Optional[str] = None,
+                                  x_admin_token: Optional[str] = Header(None)):
+    """All stored profiles merged as folded stacks (feed to flamegraph.pl or speedscope)"""
+    require_admin(x_admin_token)
+    if source not in ("spans", "samples"):
+        raise HTTPException(status_code=400, detail="Source must be 'spans' or 'samples'")
+    return profile_store.folded(source, route)
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "json", source: str = "spans",
+                      x_admin_token: Optional[str] = Header(None)):
+    """Get one request profile as JSON or folded stacks"""
+    require_admin(x_admin_token)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "folded":
+        return PlainTextResponse("\n".join(profile.folded(source)) + "\n")
+    return {**profile.summary(), "samples_folded": profile.folded("samples")}
+
+@api_router.get("/admin/dedup")
+async def get_dedup_report(x_admin_token: Optional[str] = Header(None)):
+    """How many duplicate listings were collapsed and how many stream probes that saves"""
+    require_admin(x_admin_token)
+    return radio_service.get_dedup_report()
+
+@api_router.delete("/admin/profiles")
+async def clear_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Drop all stored profiles"""
+    require_admin(x_admin_token)
+    profile_store.clear()
+    return {"cleared": True}
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(
+    ProfilingMiddleware,
+    sample_rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    admin_token=ADMIN_TOKEN,
+)
+
+# Per-client limits need to know who the client is; behind the ingress that
+# means TRUSTED_PROXY_HOPS, otherwise every user shares the proxy's address
+TRUSTED_PROXY_HOPS = os.environ.get('TRUSTED_PROXY_HOPS')
+
+app.add_middleware(
+    AdmissionControlMiddleware,
+    max_concurrent=int(os.environ.get('MAX_CONCURRENT_REQUESTS', 128)),
+    max_queued=int(os.environ.get('MAX_QUEUED_REQUESTS', 256)),
+    queue_timeout=float(os.environ.get('QUEUE_TIMEOUT', 1.0)),
+    deadline=float(os.environ.get('REQUEST_DEADLINE', 10.0)),
+    rate=float(os.environ.get('RATE_LIMIT_PER_SECOND', 20 if TRUSTED_PROXY_HOPS else 0)),
+    burst=float(os.environ.get('RATE_LIMIT_BURST', 40)),
+    trusted_proxy_hops=int(TRUSTED_PROXY_HOPS or 0),
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -123,9 +334,14 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_event():
     logger.info("Global Radio API starting up...")
+    refresh_interval = float(os.environ.get('CATALOG_REFRESH_INTERVAL', 3600))
+    if refresh_interval > 0:
+        radio_service.start_catalog_refresh(refresh_interval)
+    play_tracker.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Global Radio API shutting down...")
+    await play_tracker.close()
     await radio_service.close()
     client.close()
\ No newline at end of file
@@ -0,0 +1,277 @@
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from cachetools import TTLCache
+
+from models import RadioStation
+
+FACETS = ("country", "genre", "language", "codec", "bitrate")
+
+BITRATE_BUCKETS = ("<64", "64-127", "128-191", "192-255", "256+", "unknown")
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def bitrate_bucket(bitrate: Optional[int]) -> str:
+    if not bitrate:
+        return "unknown"
+    if bitrate < 64:
+        return "<64"
+    if bitrate < 128:
+        return "64-127"
+    if bitrate < 192:
+        return "128-191"
+    if bitrate < 256:
+        return "192-255"
+    return "256+"
+
+
+def facet_values(station: RadioStation) -> Dict[str, Tuple[str, ...]]:
+    """Values a station contributes to each facet (language can have several)"""
+    languages = tuple(dict.fromkeys(
+        language.strip().lower() for language in (station.language or '').split(',') if language.strip()
+    ))
+    return {
+        "country": (station.countrycode.upper(),) if station.countrycode else (),
+        "genre": (station.genre,) if station.genre else (),
+        "language": languages,
+        "codec": ((station.codec or '').strip().upper() or "unknown",),
+        "bitrate": (bitrate_bucket(station.bitrate),),
+    }
+
+
+def _row_popcounts(words: np.ndarray) -> np.ndarray:
+    """Set bits per row of a 2-D uint64 array"""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=1, dtype=np.int64)
+    return _POPCOUNT8[words.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+class FacetBitmaps:
+    """One bitmap per facet value, stored as rows of a (values x words) matrix"""
+
+    def __init__(self, words: int):
+        self.rows: Dict[str, int] = {}
+        self.values: List[str] = []
+        self.matrix = np.zeros((8, words), dtype=np.uint64)
+
+    def row(self, value: str) -> int:
+        row = self.rows.get(value)
+        if row is None:
+            row = self.rows[value] = len(self.values)
+            self.values.append(value)
+            if row >= self.matrix.shape[0]:
+                grown = np.zeros((self.matrix.shape[0] * 2, self.matrix.shape[1]), dtype=np.uint64)
+                grown[:self.matrix.shape[0]] = self.matrix
+                self.matrix = grown
+        return row
+
+    def grow_words(self, words: int):
+        grown = np.zeros((self.matrix.shape[0], words), dtype=np.uint64)
+        grown[:, :self.matrix.shape[1]] = self.matrix
+        self.matrix = grown
+
+    def union(self, values: List[str]) -> np.ndarray:
+        rows = [self.rows[value] for value in values if value in self.rows]
+        if not rows:
+            return np.zeros(self.matrix.shape[1], dtype=np.uint64)
+        return np.bitwise_or.reduce(self.matrix[rows], axis=0)
+
+    def set_bits(self, rows: List[int], slots: List[int]):
+        """Set many (row, slot) bits at once"""
+        slots = np.asarray(slots, dtype=np.uint64)
+        np.bitwise_or.at(
+            self.matrix,
+            (np.asarray(rows, dtype=np.int64), (slots >> np.uint64(6)).astype(np.int64)),
+            np.left_shift(np.uint64(1), slots & np.uint64(63)),
+        )
+
+    def counts(self, mask: np.ndarray) -> Dict[str, int]:
+        used = self.matrix[:len(self.values)]
+        totals = _row_popcounts(used & mask[None, :])
+        return {value: int(count) for value, count in zip(self.values, totals) if count}
+
+
+class FacetIndex:
+    """Genre, language, codec, bitrate and country counts over the station catalog.
+
+    Every station owns a bit slot; each facet value keeps a bitmap of the
+    slots carrying it. Catalog updates flip only the bits of the stations that
+    changed. Drill-down counts intersect the bitmaps of the applied filters,
+    and serialized responses are cached per filter set until the next update.
+    Counts for a facet ignore that facet's own filter, so the UI can still
+    offer the alternatives. Filter values match case-insensitively.
+
+    Large batches (a catalog sync) are built into fresh bitmaps in one
+    vectorised pass, off to the side, and swapped in under the lock that
+    queries hold, so a sync running in a worker thread never exposes a
+    half-updated index.
+    """
+
+    def __init__(self, initial_slots: int = 4096, bulk_threshold: int = 1000):
+        self.bulk_threshold = bulk_threshold
+        self.words = max(1, initial_slots // 64)
+        self.bitmaps: Dict[str, FacetBitmaps] = {facet: FacetBitmaps(self.words) for facet in FACETS}
+        self.live = np.zeros(self.words, dtype=np.uint64)
+        self.version = 0
+
+        self._slots: Dict[str, int] = {}
+        self._free_slots: List[int] = []
+        self._values: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        self._response_cache = TTLCache(maxsize=1024, ttl=3600)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def apply(self, changed: List[RadioStation], removed: List[str]):
+        """Catalog listener hook: flip the bits of stations that changed"""
+        if not changed and not removed:
+            return
+        if len(changed) + len(removed) >= self.bulk_threshold:
+            self._rebuild(changed, removed)
+            return
+        with self._lock:
+            for station_id in removed:
+                self._remove(station_id)
+            for station in changed:
+                self._upsert(station)
+            self.version += 1
+
+    def _rebuild(self, changed: List[RadioStation], removed: List[str]):
+        values = dict(self._values)
+        for station_id in removed:
+            values.pop(station_id, None)
+        for station in changed:
+            values[station.id] = facet_values(station)
+
+        words = self.words
+        while words * 64 < len(values):
+            words *= 2
+        slots = {station_id: slot for slot, station_id in enumerate(values)}
+        bitmaps = {facet: FacetBitmaps(words) for facet in FACETS}
+        for facet, facet_bitmaps in bitmaps.items():
+            rows, bits = [], []
+            for station_id, slot in slots.items():
+                for value in values[station_id][facet]:
+                    rows.append(facet_bitmaps.row(value))
+                    bits.append(slot)
+            facet_bitmaps.set_bits(rows, bits)
+
+        live = np.zeros(words, dtype=np.uint64)
+        full, rest = divmod(len(slots), 64)
+        live[:full] = np.uint64(0xFFFFFFFFFFFFFFFF)
+        if rest:
+            live[full] = np.uint64((1 << rest) - 1)
+
+        with self._lock:
+            self.words = words
+            self.bitmaps = bitmaps
+            self.live = live
+            self._slots = slots
+            self._free_slots = []
+            self._values = values
+            self.version += 1
+
+    def _allocate_slot(self) -> int:
+        if self._free_slots:
+            return self._free_slots.pop()
+        slot = len(self._slots)
+        if slot >= self.words * 64:
+            self.words *= 2
+            for bitmaps in self.bitmaps.values():
+                bitmaps.grow_words(self.words)
+            live = np.zeros(self.words, dtype=np.uint64)
+            live[:len(self.live)] = self.live
+            self.live = live
+        return slot
+
+    def _set(self, words: np.ndarray, slot: int, on: bool):
+        bit = np.uint64(1 << (slot & 63))
+        if on:
+            words[slot >> 6] |= bit
+        else:
+            words[slot >> 6] &= ~bit
+
+    def _flip(self, slot: int, values: Dict[str, Tuple[str, ...]], on: bool):
+        for facet, facet_vals in values.items():
+            bitmaps = self.bitmaps[facet]
+            for value in facet_vals:
+                row = bitmaps.row(value)
+                self._set(bitmaps.matrix[row], slot, on)
+
+    def _upsert(self, station: RadioStation):
+        values = facet_values(station)
+        previous = self._values.get(station.id)
+        if previous == values:
+            return
+
+        slot = self._slots.get(station.id)
+        if slot is None:
+            slot = self._slots[station.id] = self._allocate_slot()
+            self._set(self.live, slot, True)
+        elif previous:
+            self._flip(slot, previous, False)
+        self._flip(slot, values, True)
+        self._values[station.id] = values
+
+    def _remove(self, station_id: str):
+        slot = self._slots.pop(station_id, None)
+        if slot is None:
+            return
+        self._flip(slot, self._values.pop(station_id), False)
+        self._set(self.live, slot, False)
+        self._free_slots.append(slot)
+
+    def query(self, filters: Dict[str, List[str]], limit: int = 50) -> bytes:
+        """Facet counts under `filters` (facet -> accepted values), as serialized JSON"""
+        normalized = tuple(sorted(
+            (facet, tuple(sorted({value.casefold() for value in values}))) for facet, values in filters.items() if values
+        ))
+        cache_key = (self.version, normalized, limit)
+        body = self._response_cache.get(cache_key)
+        if body is None:
+            with self._lock:
+                cache_key = (self.version, normalized, limit)
+                resolved = {facet: self._resolve(facet, values) for facet, values in normalized}
+                body = json.dumps(self._compute(resolved, limit), separators=(",", ":")).encode("utf-8")
+            self._response_cache[cache_key] = body
+        return body
+
+    def _resolve(self, facet: str, values: Tuple[str, ...]) -> Tuple[str, ...]:
+        """Map case-folded filter values to the stored spellings ("rock" -> "Rock")"""
+        known: Dict[str, List[str]] = {}
+        for value in self.bitmaps[facet].values:
+            known.setdefault(value.casefold(), []).append(value)
+        return tuple(dict.fromkeys(v for value in values for v in known.get(value, [value])))
+
+    def _compute(self, filters: Dict[str, Tuple[str, ...]], limit: int) -> dict:
+        masks = {facet: self.bitmaps[facet].union(list(values)) for facet, values in filters.items()}
+
+        def mask_without(excluded: Optional[str]) -> np.ndarray:
+            mask = self.live
+            for facet, facet_mask in masks.items():
+                if facet != excluded:
+                    mask = mask & facet_mask
+            return mask
+
+        facets = {}
+        for facet in FACETS:
+            counts = self.bitmaps[facet].counts(mask_without(facet))
+            if facet == "bitrate":
+                ordered = [(bucket, counts[bucket]) for bucket in BITRATE_BUCKETS if bucket in counts]
+            else:
+                ordered = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+                # Keep selected values visible even when they fall outside the top `limit`
+                shown = {value for value, _ in ordered}
+                ordered += [(value, counts.get(value, 0)) for value in filters.get(facet, ()) if value not in shown]
+            facets[facet] = [{"value": value, "count": count} for value, count in ordered]
+
+        total = int(_row_popcounts(mask_without(None)[None, :])[0])
+        return {
+            "total": total,
+            "filters": {facet: list(values) for facet, values in filters.items()},
+            "facets": facets,
+        }
@@ -0,0 +1,206 @@
+import heapq
+import math
+from typing import Dict, List, Set, Tuple
+
+from models import RadioStation
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GeoIndex:
+    """Spatial index over station coordinates using fixed-size grid buckets.
+
+    Stations are bucketed by (lat, lon) cell, geohash style, and non-empty
+    cells are grouped into coarser blocks. Nearest-neighbour queries visit
+    blocks and cells best-first by their minimum possible distance and stop
+    as soon as `limit` stations are closer than anything left could be, so
+    even a whole-globe radius only touches the area around the point.
+    Small catalog updates move stations between buckets in place; large
+    batches are rebuilt off to the side and swapped in, so a sync running in
+    a worker thread never leaves readers iterating a bucket mid-update.
+    """
+
+    def __init__(self, cell_degrees: float = 1.0, block_cells: int = 10, bulk_threshold: int = 1000):
+        self.cell_degrees = cell_degrees
+        self.bulk_threshold = bulk_threshold
+        self.lon_cells = int(round(360 / cell_degrees))
+        self.block_cells = block_cells if self.lon_cells % block_cells == 0 else 1
+        self.lon_blocks = self.lon_cells // self.block_cells
+        self.min_block_row = int(math.floor(-90 / cell_degrees)) // self.block_cells
+        self.max_block_row = int(math.floor(90 / cell_degrees)) // self.block_cells
+        self.buckets: Dict[Tuple[int, int], Set[str]] = {}
+        # Block -> its non-empty cells
+        self.blocks: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+        self.points: Dict[str, Tuple[float, float, Tuple[int, int]]] = {}
+        self.stations: Dict[str, RadioStation] = {}
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (
+            int(math.floor(lat / self.cell_degrees)),
+            int(math.floor((lon + 180) / self.cell_degrees)) % self.lon_cells,
+        )
+
+    def _block(self, cell: Tuple[int, int]) -> Tuple[int, int]:
+        return cell[0] // self.block_cells, cell[1] // self.block_cells
+
+    def apply(self, changed: List[RadioStation], removed: List[str]):
+        """Catalog listener hook: move only the stations that changed"""
+        if len(changed) + len(removed) >= self.bulk_threshold:
+            self._rebuild(changed, removed)
+            return
+        for station_id in removed:
+            self.remove(station_id)
+        for station in changed:
+            self.upsert(station)
+
+    def _rebuild(self, changed: List[RadioStation], removed: List[str]):
+        points = dict(self.points)
+        stations = dict(self.stations)
+        for station_id in removed:
+            points.pop(station_id, None)
+            stations.pop(station_id, None)
+        for station in changed:
+            lat, lon = station.geo_lat, station.geo_long
+            if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                points.pop(station.id, None)
+                stations.pop(station.id, None)
+                continue
+            points[station.id] = (lat, lon, self._cell(lat, lon))
+            stations[station.id] = station
+
+        buckets: Dict[Tuple[int, int], Set[str]] = {}
+        for station_id, (_, _, cell) in points.items():
+            buckets.setdefault(cell, set()).add(station_id)
+        blocks: Dict[Tuple[int, int], Set[Tuple[int, int]]] = {}
+        for cell in buckets:
+            blocks.setdefault(self._block(cell), set()).add(cell)
+        # Readers tolerate a station missing from one of these for a moment
+        self.stations = stations
+        self.points = points
+        self.buckets = buckets
+        self.blocks = blocks
+
+    def upsert(self, station: RadioStation):
+        lat, lon = station.geo_lat, station.geo_long
+        if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            self.remove(station.id)
+            return
+
+        cell = self._cell(lat, lon)
+        previous = self.points.get(station.id)
+        if previous and previous[2] != cell:
+            self._discard(station.id, previous[2])
+        if cell not in self.buckets:
+            self.buckets[cell] = set()
+            self.blocks.setdefault(self._block(cell), set()).add(cell)
+        self.buckets[cell].add(station.id)
+        self.points[station.id] = (lat, lon, cell)
+        self.stations[station.id] = station
+
+    def remove(self, station_id: str):
+        previous = self.points.pop(station_id, None)
+        self.stations.pop(station_id, None)
+        if previous:
+            self._discard(station_id, previous[2])
+
+    def _discard(self, station_id: str, cell: Tuple[int, int]):
+        bucket = self.buckets.get(cell)
+        if bucket is not None:
+            bucket.discard(station_id)
+            if not bucket:
+                del self.buckets[cell]
+                block = self.blocks.get(self._block(cell))
+                if block is not None:
+                    block.discard(cell)
+                    if not block:
+                        del self.blocks[self._block(cell)]
+
+    def _min_distance_km(self, lat: float, lon: float, cell: Tuple[int, int], degrees: float) -> float:
+        """Minimum distance from a point to anywhere in a cell `degrees` wide"""
+        row, col = cell
+        lat_lo = row * degrees
+        lat_hi = lat_lo + degrees
+        lon_lo = col * degrees - 180
+        lon_hi = lon_lo + degrees
+
+        if lon_lo <= lon <= lon_hi:
+            if lat < lat_lo:
+                return (lat_lo - lat) * KM_PER_DEGREE
+            if lat > lat_hi:
+                return (lat - lat_hi) * KM_PER_DEGREE
+            return 0.0
+
+        # Otherwise the closest point lies on the nearer meridian edge
+        to_lo, to_hi = (lon_lo - lon) % 360, (lon - lon_hi) % 360
+        edge_lon, dlon = (lon_lo, to_lo) if to_lo <= to_hi else (lon_hi, to_hi)
+        if dlon >= 90:
+            closest = 90.0 if lat >= 0 else -90.0
+        else:
+            closest = math.degrees(math.atan(math.tan(math.radians(lat)) / math.cos(math.radians(dlon))))
+        closest = min(max(closest, lat_lo), lat_hi)
+        return haversine_km(lat, lon, closest, edge_lon)
+
+    def nearest(self, lat: float, lon: float, radius_km: float, limit: int) -> List[Tuple[float, RadioStation]]:
+        """Return up to `limit` (distance_km, station) pairs within `radius_km`, closest first"""
+        buckets, blocks, points, stations = self.buckets, self.blocks, self.points, self.stations
+        block_degrees = self.cell_degrees * self.block_cells
+        start = self._block(self._cell(lat, lon))
+        # (bound, is_cell, cell or block): blocks expand into their non-empty cells
+        frontier = [(0.0, False, start)]
+        seen = {start}
+        # Max-heap of the best hits so far as (-distance, station id)
+        best: List[Tuple[float, str]] = []
+
+        while frontier:
+            bound, is_cell, key = heapq.heappop(frontier)
+            if bound > radius_km or (len(best) >= limit and bound > -best[0][0]):
+                break
+
+            if is_cell:
+                for station_id in tuple(buckets.get(key, ())):
+                    point = points.get(station_id)
+                    if point is None:
+                        continue
+                    distance = haversine_km(lat, lon, point[0], point[1])
+                    if distance > radius_km:
+                        continue
+                    if len(best) < limit:
+                        heapq.heappush(best, (-distance, station_id))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, station_id))
+                if len(best) >= len(points):
+                    break
+                continue
+
+            for cell in tuple(blocks.get(key, ())):
+                heapq.heappush(frontier, (self._min_distance_km(lat, lon, cell, self.cell_degrees), True, cell))
+
+            row, col = key
+            for d_row in (-1, 0, 1):
+                next_row = row + d_row
+                if not self.min_block_row <= next_row <= self.max_block_row:
+                    continue
+                for d_col in (-1, 0, 1):
+                    # Wrap around the antimeridian
+                    neighbour = (next_row, (col + d_col) % self.lon_blocks)
+                    if neighbour not in seen:
+                        seen.add(neighbour)
+                        heapq.heappush(frontier, (self._min_distance_km(lat, lon, neighbour, block_degrees), False, neighbour))
+
+        hits = sorted((-negative, station_id) for negative, station_id in best)
+        return [
+            (distance, stations[station_id]) for distance, station_id in hits if station_id in stations
+        ]
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from cachetools import TTLCache
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class PlayTracker:
+    """Counts plays of our own users without a database round trip per click.
+
+    Plays are aggregated in sharded in-memory counters and written to MongoDB
+    as batched `$inc` bulk writes on an interval. Shards are swapped out and
+    flushed one at a time, so each bulk write stays bounded and recording can
+    continue while a flush is in flight. Counts that were not written, whether
+    rejected, unreachable or interrupted, are folded back for the next flush. Recent plays are also kept in
+    per-minute buckets to rank what is trending over a sliding window.
+    """
+
+    def __init__(self, collection, shards: int = 16, flush_interval: float = 10.0,
+                 window_seconds: int = 3600, bucket_seconds: int = 60):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+
+        self._shards: List[Dict[str, int]] = [{} for _ in range(shards)]
+        self._buckets: Dict[int, Dict[str, int]] = {}
+        # Rankings only move once per bucket, cache them for that long
+        self._trending_cache = TTLCache(maxsize=64, ttl=bucket_seconds)
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def record(self, station_id: str):
+        """Count one play"""
+        shard = self._shards[hash(station_id) % len(self._shards)]
+        shard[station_id] = shard.get(station_id, 0) + 1
+
+        bucket_id = int(time.time() // self.bucket_seconds)
+        bucket = self._buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self._buckets[bucket_id] = {}
+            self._expire_buckets(bucket_id)
+        bucket[station_id] = bucket.get(station_id, 0) + 1
+
+    def _expire_buckets(self, current_bucket: int):
+        oldest = current_bucket - self.window_seconds // self.bucket_seconds
+        for bucket_id in [b for b in self._buckets if b <= oldest]:
+            del self._buckets[bucket_id]
+
+    @property
+    def pending(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+    async def flush(self) -> int:
+        """Write buffered counts to MongoDB, return the number of stations updated"""
+        flushed = 0
+        now = datetime.utcnow()
+        for index in range(len(self._shards)):
+            counts = self._shards[index]
+            if not counts:
+                continue
+            self._shards[index] = {}
+
+            station_ids = list(counts)
+            operations = [
+                UpdateOne(
+                    {"_id": station_id},
+                    {"$inc": {"plays": counts[station_id]}, "$max": {"last_played": now}},
+                    upsert=True,
+                )
+                for station_id in station_ids
+            ]
+            # Until the write is acknowledged every count is still ours to keep
+            failed = counts
+            unreachable = False
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+                failed = {}
+            except BulkWriteError as e:
+                # Unordered writes apply everything else, so only retry the rejected updates
+                errors = e.details.get("writeErrors", [])
+                failed = {station_ids[error["index"]]: counts[station_ids[error["index"]]] for error in errors}
+                logger.error(f"Failed to flush {len(failed)} of {len(operations)} play counters: {e}")
+            except Exception as e:
+                logger.error(f"Failed to flush {len(operations)} play counters: {e}")
+                # MongoDB is likely unreachable, leave the other shards for the next flush
+                unreachable = True
+            finally:
+                flushed += len(operations) - len(failed)
+                shard = self._shards[index]
+                for station_id, count in failed.items():
+                    shard[station_id] = shard.get(station_id, 0) + count
+            if unreachable:
+                break
+        return flushed
+
+    def window_counts(self, window_seconds: Optional[int] = None) -> Dict[str, int]:
+        """Plays per station over the last `window_seconds`"""
+        window_seconds = window_seconds or self.window_seconds
+        oldest = int(time.time() // self.bucket_seconds) - window_seconds // self.bucket_seconds
+        totals: Dict[str, int] = {}
+        for bucket_id, bucket in list(self._buckets.items()):
+            if bucket_id > oldest:
+                for station_id, count in bucket.items():
+                    totals[station_id] = totals.get(station_id, 0) + count
+        return totals
+
+    def _ranking(self, window_seconds: Optional[int]) -> Tuple[Dict[str, int], List[Tuple[str, int]]]:
+        """Plays per station over the window and all stations ranked by them, cached"""
+        window_seconds = min(window_seconds or self.window_seconds, self.window_seconds)
+        cached = self._trending_cache.get(window_seconds)
+        if cached is None:
+            totals = self.window_counts(window_seconds)
+            ranking = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+            cached = self._trending_cache[window_seconds] = (totals, ranking)
+        return cached
+
+    def trending(self, window_seconds: Optional[int] = None, limit: int = 20,
+                 include: Optional[Callable[[str], bool]] = None) -> List[Tuple[str, int]]:
+        """Most played stations over the window as (station id, plays).
+
+        `include` drops stations before the ranking is cut to `limit`, so
+        stations that left the catalog do not take up slots.
+        """
+        _, ranking = self._ranking(window_seconds)
+        if include is None:
+            return ranking[:limit]
+        return list(islice((item for item in ranking if include(item[0])), limit))
+
+    def sort_by_trending(self, stations: Iterable, window_seconds: Optional[int] = None) -> list:
+        """Order stations by recent plays, keeping the incoming order for ties"""
+        totals, _ = self._ranking(window_seconds)
+        return sorted(stations, key=lambda station: totals.get(station.id, 0), reverse=True)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Play counter flush failed: {e}")
+
+    def start(self):
+        """Flush in the background every `flush_interval` seconds"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the background flush and write out what is left"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            # Let an interrupted flush fold its shard back before the final one
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
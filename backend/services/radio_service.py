@@ -1,17 +1,52 @@
+import asyncio
+import contextvars
 import httpx
 import logging
-from typing import List, Dict, Optional
-from cachetools import TTLCache
-from models import Country, RadioStation, RadioBrowserStation, RadioBrowserCountry
+import time
+from typing import Awaitable, Callable, List, Dict, Optional
+from cachetools import LRUCache, TTLCache
+from models import Country, RadioStation, NearbyStation, SimilarStation, RadioBrowserStation, RadioBrowserCountry
+from services.station_catalog import StationCatalog
+from services.geo_index import GeoIndex
+from services.similarity_index import SimilarityIndex
+from services.facet_index import FacetIndex
+from services.station_dedup import DedupReport, StationDeduplicator
+from profiling import current_profile, span
+from admission import DeadlineExceeded, remaining_time
 
 logger = logging.getLogger(__name__)
 
 class RadioBrowserService:
-    def __init__(self):
-        self.base_url = "https://de1.api.radio-browser.info/json"
-        self.client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, base_url: str = "https://de1.api.radio-browser.info/json",
+                 client: Optional[httpx.AsyncClient] = None, timeout: float = 30.0,
+                 retry_backoff: float = 30.0, similarity_debounce: float = 1.0):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.client = client or httpx.AsyncClient(timeout=timeout)
         # Cache for 1 hour (3600 seconds)
         self.cache = TTLCache(maxsize=100, ttl=3600)
+        # Last good results, served when the upstream is slow or down
+        self.stale_cache = LRUCache(maxsize=500)
+        # Keys whose last fetch failed; their stale copy is served without retrying until expiry
+        self._failed = TTLCache(maxsize=500, ttl=retry_backoff)
+        # Upstream fetches in flight, shared by every request missing the same key
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+        # Full station catalog and the indexes derived from it
+        self.catalog = StationCatalog()
+        self.geo_index = GeoIndex()
+        self.catalog.add_listener(self.geo_index)
+        self.similarity_index = SimilarityIndex()
+        self.catalog.add_listener(self.similarity_index)
+        # Stations from country lists are scored in one pass once a burst of fetches settles
+        self.similarity_debounce = similarity_debounce
+        self._similarity_task: Optional[asyncio.Task] = None
+        self.facet_index = FacetIndex()
+        self.catalog.add_listener(self.facet_index)
+        # Near-duplicate listings are collapsed before anything is cached or indexed
+        self.deduplicator = StationDeduplicator()
+        self.dedup_reports: Dict[str, DedupReport] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
         
         # Country flag mapping
         self.country_flags = {
@@ -30,86 +65,271 @@ class RadioBrowserService:
 
     async def get_countries(self) -> List[Country]:
         """Get list of countries with radio stations"""
-        cache_key = "countries"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        countries = await self._cached("countries", self._fetch_countries, "countries")
+        return countries if countries is not None else self._get_fallback_countries()
 
-        try:
-            response = await self.client.get(f"{self.base_url}/countries")
+    async def _fetch_countries(self) -> List[Country]:
+        with span("upstream_fetch"):
+            response = await self._get_upstream(f"{self.base_url}/countries")
             response.raise_for_status()
+        with span("upstream_decode"):
             data = response.json()
-            
-            countries = []
-            for item in data:
-                try:
-                    country_data = RadioBrowserCountry(**item)
-                    # Only include countries with reasonable number of stations
-                    if country_data.stationcount >= 10:
-                        country = Country(
-                            code=country_data.iso_3166_1,
-                            name=country_data.name,
-                            flag=self.country_flags.get(country_data.iso_3166_1, '🌍'),
-                            station_count=country_data.stationcount
-                        )
-                        countries.append(country)
-                except Exception as e:
-                    logger.warning(f"Skipping invalid country data: {e}")
-                    continue
-            
-            # Sort by station count (descending) and take top 50
-            countries.sort(key=lambda x: x.station_count, reverse=True)
-            countries = countries[:50]
-            
-            self.cache[cache_key] = countries
-            return countries
-            
-        except Exception as e:
-            logger.error(f"Failed to fetch countries: {e}")
-            return self._get_fallback_countries()
+        
+        countries = []
+        for item in data:
+            try:
+                country_data = RadioBrowserCountry(**item)
+                # Only include countries with reasonable number of stations
+                if country_data.stationcount >= 10:
+                    country = Country(
+                        code=country_data.iso_3166_1,
+                        name=country_data.name,
+                        flag=self.country_flags.get(country_data.iso_3166_1, '🌍'),
+                        station_count=country_data.stationcount
+                    )
+                    countries.append(country)
+            except Exception as e:
+                logger.warning(f"Skipping invalid country data: {e}")
+                continue
+        
+        # Sort by station count (descending) and take top 50
+        countries.sort(key=lambda x: x.station_count, reverse=True)
+        return countries[:50]
 
     async def get_stations_by_country(self, country_code: str, limit: int = 50) -> List[RadioStation]:
         """Get radio stations for a specific country"""
-        cache_key = f"stations_{country_code}_{limit}"
-        if cache_key in self.cache:
-            return self.cache[cache_key]
+        stations = await self._cached(
+            f"stations_{country_code}_{limit}",
+            lambda: self._fetch_stations(country_code, limit),
+            f"stations for {country_code}",
+        )
+        return stations if stations is not None else []
+
+    async def _fetch_stations(self, country_code: str, limit: int) -> List[RadioStation]:
+        # Fetch extra listings so the limit is still filled once duplicates are collapsed
+        fetch_limit = limit + max(10, limit // 2)
+        with span("upstream_fetch"):
+            response = await self._get_upstream(
+                f"{self.base_url}/stations/bycountrycodeexact/{country_code}?hidebroken=true&order=clickcount&reverse=true&limit={fetch_limit}"
+            )
+            response.raise_for_status()
+        with span("upstream_decode"):
+            data = response.json()
+        
+        stations = self._parse_stations(data)
+        with span("dedupe"):
+            stations, aliases, report = self.deduplicator.dedupe(stations)
+        stations = stations[:limit]
+        self.dedup_reports[country_code] = report
+        self.catalog.upsert(stations, aliases)
+        if self.similarity_index.has_pending:
+            self._schedule_similarity_refresh()
+        return stations
+
+    async def _cached(self, cache_key: str, fetch: Callable[[], Awaitable[list]], what: str) -> Optional[list]:
+        """Serve `cache_key` from cache, fetching it from upstream at most once at a time.
+
+        A stale copy is returned at once while a background fetch refreshes
+        it, so a slow upstream never holds a request that has something to
+        serve. Without one, concurrent misses wait on the same fetch, each no
+        longer than its own deadline. Returns None if nothing could be fetched.
+        """
+        with span("cache_lookup"):
+            cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        stale = self.stale_cache.get(cache_key)
+        if stale is not None:
+            if cache_key not in self._failed:
+                # Detached from the request, so its deadline and profile do not apply
+                contextvars.Context().run(self._fetch_once, cache_key, fetch, what)
+            return stale
+
+        task = self._fetch_once(cache_key, fetch, what)
+        try:
+            # Shielded so a request giving up does not cancel the fetch for the others
+            return await asyncio.wait_for(asyncio.shield(task), remaining_time())
+        except asyncio.TimeoutError:
+            logger.error(f"Request deadline passed waiting for {what}")
+            return None
+
+    def _fetch_once(self, cache_key: str, fetch: Callable[[], Awaitable[list]], what: str) -> asyncio.Task:
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_into_cache(cache_key, fetch, what))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        return task
 
+    async def _fetch_into_cache(self, cache_key: str, fetch: Callable[[], Awaitable[list]],
+                                what: str) -> Optional[list]:
         try:
+            result = await fetch()
+        except Exception as e:
+            # repr, as timeouts carry no message
+            logger.error(f"Failed to fetch {what}: {e!r}")
+            self._failed[cache_key] = True
+            return None
+        self._failed.pop(cache_key, None)
+        self.cache[cache_key] = result
+        self.stale_cache[cache_key] = result
+        return result
+
+    async def _get_upstream(self, url: str) -> httpx.Response:
+        """GET from Radio Browser, bounded by the current request's deadline.
+
+        httpx timeouts apply per connect/read, so the deadline is enforced
+        on the whole call.
+        """
+        remaining = remaining_time()
+        if remaining is None:
+            return await self.client.get(url)
+        if remaining <= 0:
+            raise DeadlineExceeded("Request deadline passed before upstream call")
+        timeout = min(self.timeout, remaining)
+        return await asyncio.wait_for(self.client.get(url, timeout=timeout), timeout)
+
+    def get_nearby_stations(self, lat: float, lon: float, radius_km: float, limit: int = 20) -> List[NearbyStation]:
+        """Get stations closest to a point, served from the in-memory geo index"""
+        return [
+            NearbyStation(**station.model_dump(), distance_km=round(distance, 2))
+            for distance, station in self.geo_index.nearest(lat, lon, radius_km, limit)
+        ]
+
+    def get_dedup_report(self) -> dict:
+        """Duplicate listings collapsed in the catalog and per country fetch"""
+        countries = {code: report for code, report in self.dedup_reports.items() if code != "catalog"}
+        totals = DedupReport(
+            stations_in=sum(r.stations_in for r in countries.values()),
+            stations_out=sum(r.stations_out for r in countries.values()),
+            distinct_urls_in=sum(r.distinct_urls_in for r in countries.values()),
+            stations_with_variants=sum(r.stations_with_variants for r in countries.values()),
+        )
+        catalog = self.dedup_reports.get("catalog")
+        return {
+            "catalog": catalog.summary() if catalog else None,
+            "countries": totals.summary(),
+            "by_country": {code: report.summary() for code, report in sorted(countries.items())},
+        }
+
+    def get_similar_stations(self, station_id: str, limit: int = 10) -> Optional[List[SimilarStation]]:
+        """Get precomputed similar stations, or None if the station is not indexed"""
+        # Duplicate listings resolve to the station they were collapsed into
+        station = self.catalog.get(station_id)
+        if station is not None:
+            station_id = station.id
+        neighbours = self.similarity_index.get(station_id, limit)
+        if neighbours is None:
+            return None
+
+        similar = []
+        for neighbour_id, score in neighbours:
+            station = self.catalog.get(neighbour_id)
+            if station is not None:
+                similar.append(SimilarStation(**station.model_dump(), similarity=score))
+        return similar
+
+    async def refresh_catalog(self, page_size: int = 10000, max_stations: int = 100000) -> int:
+        """Download the full station list and sync it into the catalog.
+
+        Only stations that were added, changed or removed since the previous
+        refresh are passed on to the derived indexes.
+        """
+        stations = []
+        offset = 0
+        while offset < max_stations:
             response = await self.client.get(
-                f"{self.base_url}/stations/bycountrycodeexact/{country_code}?hidebroken=true&order=clickcount&reverse=true&limit={limit}"
+                f"{self.base_url}/stations/search?hidebroken=true&order=clickcount&reverse=true&limit={page_size}&offset={offset}"
             )
             response.raise_for_status()
             data = response.json()
-            
-            stations = []
-            for item in data:
-                try:
-                    raw_station = RadioBrowserStation(**item)
-                    station = self._transform_station(raw_station)
-                    stations.append(station)
-                except Exception as e:
-                    logger.warning(f"Skipping invalid station data: {e}")
-                    continue
-            
-            self.cache[cache_key] = stations
-            return stations
-            
-        except Exception as e:
-            logger.error(f"Failed to fetch stations for {country_code}: {e}")
-            return []
+            stations.extend(await asyncio.to_thread(self._parse_stations, data))
+            if len(data) < page_size:
+                break
+            offset += page_size
+
+        stations, aliases, report = await asyncio.to_thread(self.deduplicator.dedupe, stations)
+        self.dedup_reports["catalog"] = report
+        # Diffing 100k stations and updating the indexes takes seconds, keep it off the event loop
+        changed = await asyncio.to_thread(self.catalog.sync, stations, aliases)
+        logger.info(
+            f"Station catalog refreshed: {len(self.catalog)} stations, {changed} changed, "
+            f"{report.duplicates_removed} duplicate listings collapsed"
+        )
+
+        # Rescoring is CPU bound, keep it off the event loop
+        if self.similarity_index.has_pending:
+            await asyncio.to_thread(self.similarity_index.refresh)
+        return changed
+
+    async def _refresh_catalog_loop(self, interval: float):
+        while True:
+            try:
+                await self.refresh_catalog()
+            except Exception as e:
+                logger.error(f"Failed to refresh station catalog: {e}")
+            await asyncio.sleep(interval)
+
+    def start_catalog_refresh(self, interval: float = 3600):
+        """Keep the catalog fresh in the background"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_catalog_loop(interval))
+
+    def _schedule_similarity_refresh(self):
+        if self._similarity_task is None or self._similarity_task.done():
+            # Detached from the request that triggered it
+            self._similarity_task = contextvars.Context().run(asyncio.create_task, self._refresh_similarity())
+
+    async def _refresh_similarity(self):
+        while self.similarity_index.has_pending:
+            await asyncio.sleep(self.similarity_debounce)
+            try:
+                # Rescoring is CPU bound, keep it off the event loop
+                await asyncio.to_thread(self.similarity_index.refresh)
+            except Exception as e:
+                logger.error(f"Failed to refresh similarity index: {e!r}")
+                return
+
+    def _parse_stations(self, data: List[Dict]) -> List[RadioStation]:
+        # Profiled requests time Pydantic validation and our transform separately
+        profile = current_profile()
+        stations = []
+        validate_seconds = transform_seconds = 0.0
+        for item in data:
+            try:
+                if profile is not None:
+                    start = time.perf_counter()
+                raw_station = RadioBrowserStation(**item)
+                if profile is not None:
+                    validated = time.perf_counter()
+                    validate_seconds += validated - start
+                station = self._transform_station(raw_station)
+                if profile is not None:
+                    transform_seconds += time.perf_counter() - validated
+                stations.append(station)
+            except Exception as e:
+                logger.warning(f"Skipping invalid station data: {e}")
+                continue
+        if profile is not None:
+            profile.record("validate", validate_seconds)
+            profile.record("transform", transform_seconds)
+        return stations
 
-    def _transform_station(self, raw: RadioBrowserStation) -> RadioStation:
+    @classmethod
+    def _transform_station(cls, raw: RadioBrowserStation) -> RadioStation:
         """Transform Radio Browser station to our format"""
         # Parse genre from tags
-        genre = self._parse_genre(raw.tags)
+        genre = cls._parse_genre(raw.tags)
         
         # Generate frequency (since most APIs don't provide it)
-        frequency = self._generate_frequency(raw.name, raw.stationuuid)
+        frequency = cls._generate_frequency(raw.name, raw.stationuuid)
         
         # Format listener count
-        listeners = self._format_listeners(raw.clickcount)
+        listeners = cls._format_listeners(raw.clickcount)
         
         # Generate description
-        description = self._generate_description(raw.name, raw.tags, raw.country)
+        description = cls._generate_description(raw.name, raw.tags, raw.country)
         
         return RadioStation(
             id=raw.stationuuid,
@@ -124,14 +344,18 @@ class RadioBrowserService:
             country=raw.country,
             countrycode=raw.countrycode,
             language=raw.language,
+            tags=raw.tags,
             bitrate=raw.bitrate,
             codec=raw.codec,
             votes=raw.votes,
             clickcount=raw.clickcount,
-            lastcheckok=raw.lastcheckok
+            lastcheckok=raw.lastcheckok,
+            geo_lat=raw.geo_lat,
+            geo_long=raw.geo_long
         )
 
-    def _parse_genre(self, tags: Optional[str]) -> str:
+    @staticmethod
+    def _parse_genre(tags: Optional[str]) -> str:
         """Parse genre from tags"""
         if not tags:
             return "Music"
@@ -173,7 +397,8 @@ class RadioBrowserService:
         first_tag = tags.split(',')[0].strip().title()
         return first_tag if first_tag else "Music"
 
-    def _generate_frequency(self, name: str, station_id: str) -> str:
+    @staticmethod
+    def _generate_frequency(name: str, station_id: str) -> str:
         """Generate a plausible frequency based on station name and ID"""
         # Use hash of station ID to generate consistent frequency
         hash_val = hash(station_id) % 1000
@@ -183,7 +408,8 @@ class RadioBrowserService:
         
         return f"{fm_freq:.1f} FM"
 
-    def _format_listeners(self, clickcount: int) -> str:
+    @staticmethod
+    def _format_listeners(clickcount: int) -> str:
         """Format listener count in a readable format"""
         if clickcount >= 1000000:
             return f"{clickcount / 1000000:.1f}M"
@@ -192,7 +418,8 @@ class RadioBrowserService:
         else:
             return str(clickcount)
 
-    def _generate_description(self, name: str, tags: Optional[str], country: str) -> str:
+    @staticmethod
+    def _generate_description(name: str, tags: Optional[str], country: str) -> str:
         """Generate a description for the station"""
         if not tags:
             return f"Radio station from {country}"
@@ -219,7 +446,13 @@ class RadioBrowserService:
         ]
 
     async def close(self):
-        """Close the HTTP client"""
+        """Stop background work and close the HTTP client"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self._similarity_task is not None:
+            self._similarity_task.cancel()
+        for task in list(self._inflight.values()):
+            task.cancel()
         await self.client.aclose()
 
 # Global service instance
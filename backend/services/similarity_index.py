@@ -0,0 +1,243 @@
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+from models import RadioStation
+
+logger = logging.getLogger(__name__)
+
+# (station id, cosine similarity)
+Neighbour = Tuple[str, float]
+
+
+def station_terms(station: RadioStation) -> Set[str]:
+    """Namespaced terms describing a station: its tags, languages and genre"""
+    terms = set()
+    for tag in (station.tags or '').split(','):
+        tag = tag.strip().lower()
+        if tag:
+            terms.add(f"tag:{tag}")
+    for language in (station.language or '').split(','):
+        language = language.strip().lower()
+        if language:
+            terms.add(f"lang:{language}")
+    if station.genre:
+        terms.add(f"genre:{station.genre.lower()}")
+    return terms
+
+
+class SimilarityIndex:
+    """Precomputed top-k "similar stations" from TF-IDF vectors.
+
+    Catalog updates are queued by `apply` and folded in by `refresh`, which
+    is CPU bound and meant to run in a worker thread. A full build scores
+    every station against the whole catalog in batched sparse matrix
+    products. Small updates only rescore the changed stations and the
+    stations whose neighbour lists referenced them; the IDF weights are kept
+    from the last full build until churn exceeds `rebuild_ratio`.
+    """
+
+    def __init__(self, top_k: int = 20, batch_size: int = 256, rebuild_ratio: float = 0.1):
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.rebuild_ratio = rebuild_ratio
+
+        self.neighbours: Dict[str, List[Neighbour]] = {}
+        self.last_build_seconds: Optional[float] = None
+
+        self._stations: Dict[str, RadioStation] = {}
+        self._vectors: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._term_ids: Dict[str, int] = {}
+        self._idf: List[float] = []
+        self._built_size = 0
+        self._churn = 0
+
+        # Terms of every station applied so far, to ignore changes that do not affect scoring
+        self._terms: Dict[str, frozenset] = {}
+        self._pending_changed: Dict[str, RadioStation] = {}
+        self._pending_removed: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.neighbours)
+
+    def get(self, station_id: str, limit: int) -> Optional[List[Neighbour]]:
+        neighbours = self.neighbours.get(station_id)
+        return neighbours[:limit] if neighbours is not None else None
+
+    @property
+    def has_pending(self) -> bool:
+        return bool(self._pending_changed or self._pending_removed)
+
+    def apply(self, changed: List[RadioStation], removed: List[str]):
+        """Catalog listener hook: queue the changes for the next refresh.
+
+        Stations whose terms are unchanged (new click or vote counts) are
+        skipped, they score exactly as before.
+        """
+        with self._pending_lock:
+            for station_id in removed:
+                self._terms.pop(station_id, None)
+                self._pending_changed.pop(station_id, None)
+                self._pending_removed.add(station_id)
+            for station in changed:
+                terms = frozenset(station_terms(station))
+                if self._terms.get(station.id) == terms:
+                    continue
+                self._terms[station.id] = terms
+                self._pending_removed.discard(station.id)
+                self._pending_changed[station.id] = station
+
+    def refresh(self) -> int:
+        """Fold queued catalog changes into the neighbour lists, return stations rescored"""
+        with self._refresh_lock:
+            with self._pending_lock:
+                changed, removed = self._pending_changed, self._pending_removed
+                self._pending_changed, self._pending_removed = {}, set()
+            removed = {station_id for station_id in removed if station_id in self._stations}
+            if not changed and not removed:
+                return 0
+
+            start = time.perf_counter()
+            for station_id in removed:
+                del self._stations[station_id]
+            self._stations.update(changed)
+            self._churn += len(changed) + len(removed)
+
+            if not self._built_size or self._churn > self.rebuild_ratio * self._built_size:
+                rescored = self._full_build()
+            else:
+                rescored = self._incremental_update(changed, removed)
+
+            self.last_build_seconds = time.perf_counter() - start
+            logger.info(
+                f"Similarity index refreshed: {rescored} of {len(self._stations)} stations "
+                f"rescored in {self.last_build_seconds:.2f}s"
+            )
+            return rescored
+
+    # Vectorising -----------------------------------------------------------
+
+    def _vectorise(self, station: RadioStation) -> Tuple[np.ndarray, np.ndarray]:
+        """L2-normalised TF-IDF vector as (term ids, weights)"""
+        indices = []
+        for term in station_terms(station):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                # Unseen since the last full build, so rare: weight it like df == 1
+                term_id = self._term_ids[term] = len(self._idf)
+                self._idf.append(math.log((1 + len(self._stations)) / 2) + 1)
+            indices.append(term_id)
+
+        indices = np.array(sorted(indices), dtype=np.int32)
+        weights = np.array([self._idf[i] for i in indices], dtype=np.float32)
+        norm = float(np.sqrt((weights ** 2).sum()))
+        if norm:
+            weights /= norm
+        return indices, weights
+
+    def _matrix(self, ids: List[str]) -> sp.csr_matrix:
+        vectors = [self._vectors[station_id] for station_id in ids]
+        lengths = np.fromiter((len(v[0]) for v in vectors), dtype=np.int64, count=len(vectors))
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        indices = np.concatenate([v[0] for v in vectors]) if vectors else np.empty(0, np.int32)
+        data = np.concatenate([v[1] for v in vectors]) if vectors else np.empty(0, np.float32)
+        return sp.csr_matrix((data, indices, indptr), shape=(len(ids), len(self._idf)))
+
+    # Scoring ---------------------------------------------------------------
+
+    def _top_k(self, X: sp.csr_matrix, XT: sp.csr_matrix, ids: List[str], rows: List[int]) -> Dict[str, List[Neighbour]]:
+        """Score `rows` against every station in batches and keep the best k"""
+        k = min(self.top_k, len(ids) - 1)
+        result = {}
+        if k <= 0:
+            return {ids[row]: [] for row in rows}
+
+        for offset in range(0, len(rows), self.batch_size):
+            batch = np.array(rows[offset:offset + self.batch_size])
+            scores = (X[batch] @ XT).toarray()
+            scores[np.arange(len(batch)), batch] = -1.0
+
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+            for i, row in enumerate(batch):
+                result[ids[row]] = [
+                    (ids[col], round(float(score), 4))
+                    for col, score in zip(top[i], top_scores[i]) if score > 0
+                ]
+        return result
+
+    def _full_build(self) -> int:
+        ids = list(self._stations)
+        terms = [station_terms(self._stations[station_id]) for station_id in ids]
+
+        df = Counter(term for term_set in terms for term in term_set)
+        n = len(ids)
+        self._term_ids = {term: term_id for term_id, term in enumerate(df)}
+        self._idf = [math.log((1 + n) / (1 + count)) + 1 for count in df.values()]
+
+        self._vectors = {
+            station_id: self._vectorise(self._stations[station_id]) for station_id in ids
+        }
+        X = self._matrix(ids)
+        self.neighbours = self._top_k(X, X.T.tocsr(), ids, list(range(n)))
+        self._built_size = n
+        self._churn = 0
+        return n
+
+    def _incremental_update(self, changed: Dict[str, RadioStation], removed: Set[str]) -> int:
+        touched = set(changed) | removed
+        for station_id in removed:
+            self._vectors.pop(station_id, None)
+        for station_id, station in changed.items():
+            self._vectors[station_id] = self._vectorise(station)
+
+        ids = list(self._stations)
+        row_of = {station_id: row for row, station_id in enumerate(ids)}
+        X = self._matrix(ids)
+        XT = X.T.tocsr()
+
+        # Copy-on-write so concurrent lookups never see a half-updated map
+        neighbours = {
+            station_id: nbs for station_id, nbs in self.neighbours.items() if station_id not in removed
+        }
+
+        # Changed stations, and stations that listed a touched one, are rescored in full
+        stale = set(changed) | {
+            station_id for station_id, nbs in neighbours.items()
+            if any(nid in touched for nid, _ in nbs)
+        }
+        neighbours.update(self._top_k(X, XT, ids, [row_of[station_id] for station_id in stale]))
+
+        # Everyone else keeps their list unless a changed station now beats their k-th best
+        thresholds = np.zeros(len(ids), dtype=np.float32)
+        for station_id, nbs in neighbours.items():
+            if len(nbs) >= self.top_k:
+                thresholds[row_of[station_id]] = nbs[-1][1]
+        for station_id in stale:
+            thresholds[row_of[station_id]] = np.inf
+
+        changed_rows = [row_of[station_id] for station_id in changed]
+        for offset in range(0, len(changed_rows), self.batch_size):
+            batch = changed_rows[offset:offset + self.batch_size]
+            scores = (X[batch] @ XT).toarray()
+            for i, col in zip(*np.nonzero(scores > thresholds[None, :])):
+                target, candidate = ids[col], ids[batch[i]]
+                merged = [nb for nb in neighbours.get(target, []) if nb[0] != candidate]
+                merged.append((candidate, round(float(scores[i, col]), 4)))
+                merged.sort(key=lambda nb: nb[1], reverse=True)
+                neighbours[target] = merged[:self.top_k]
+
+        self.neighbours = neighbours
+        return len(stale)
@@ -0,0 +1,113 @@
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Protocol, Tuple
+
+from models import RadioStation
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogListener(Protocol):
+    def apply(self, changed: List[RadioStation], removed: List[str]) -> None:
+        ...
+
+
+class StationCatalog:
+    """In-memory copy of every station we have ingested.
+
+    Derived indexes register as listeners and receive only the stations that
+    were added, changed or removed, so they can update incrementally instead
+    of rebuilding from scratch on every refresh. Ids of duplicate listings
+    that were collapsed into another station resolve to that station.
+
+    A full sync is meant to run in a worker thread. Upserts arriving from the
+    event loop meanwhile are queued and applied right after it, rather than
+    blocking the loop or racing it in the listeners.
+    """
+
+    def __init__(self):
+        self.stations: Dict[str, RadioStation] = {}
+        self.aliases: Dict[str, str] = {}
+        self.listeners: List[CatalogListener] = []
+        self._lock = threading.Lock()
+        self._deferred: Deque[Tuple[List[RadioStation], Optional[Dict[str, str]]]] = deque()
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def get(self, station_id: str) -> Optional[RadioStation]:
+        station = self.stations.get(station_id)
+        if station is None and station_id in self.aliases:
+            station = self.stations.get(self.aliases[station_id])
+        return station
+
+    def add_listener(self, listener: CatalogListener):
+        self.listeners.append(listener)
+        if self.stations:
+            listener.apply(list(self.stations.values()), [])
+
+    def upsert(self, stations: Iterable[RadioStation], aliases: Optional[Dict[str, str]] = None) -> int:
+        """Add or update stations without removing anything else.
+
+        Returns the number of stations changed, or 0 when the batch was
+        queued behind a running sync.
+        """
+        stations = list(stations)
+        if not self._lock.acquire(blocking=False):
+            self._deferred.append((stations, aliases))
+            self._drain()
+            return 0
+        try:
+            return self._upsert(stations, aliases)
+        finally:
+            self._lock.release()
+
+    def _drain(self):
+        """Apply queued upserts unless someone else holds the catalog"""
+        while self._deferred and self._lock.acquire(blocking=False):
+            try:
+                while self._deferred:
+                    self._upsert(*self._deferred.popleft())
+            finally:
+                self._lock.release()
+
+    def _upsert(self, stations: List[RadioStation], aliases: Optional[Dict[str, str]]) -> int:
+        for alias, station_id in (aliases or {}).items():
+            if alias not in self.stations:
+                self.aliases.setdefault(alias, station_id)
+        changed = []
+        for station in stations:
+            # Partial batches can disagree with the last full sync about which
+            # listing is canonical; the full sync wins until the next one
+            if self.aliases.get(station.id) in self.stations:
+                continue
+            if self.stations.get(station.id) != station:
+                self.stations[station.id] = station
+                changed.append(station)
+        self._notify(changed, [])
+        return len(changed)
+
+    def sync(self, stations: Iterable[RadioStation], aliases: Optional[Dict[str, str]] = None) -> int:
+        """Replace the catalog with a full snapshot, applying only the difference"""
+        with self._lock:
+            self.aliases = dict(aliases or {})
+            incoming = {station.id: station for station in stations}
+            removed = [station_id for station_id in self.stations if station_id not in incoming]
+            changed = [
+                station for station_id, station in incoming.items()
+                if self.stations.get(station_id) != station
+            ]
+            self.stations = incoming
+            self._notify(changed, removed)
+        self._drain()
+        return len(changed) + len(removed)
+
+    def _notify(self, changed: List[RadioStation], removed: List[str]):
+        if not changed and not removed:
+            return
+        for listener in self.listeners:
+            try:
+                listener.apply(changed, removed)
+            except Exception as e:
+                logger.error(f"Failed to update {type(listener).__name__}: {e}")
@@ -0,0 +1,309 @@
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from models import RadioStation, StationVariant
+
+# Query parameters that only bust caches or attribute traffic, never select a stream
+TRACKING_PARAMS = {
+    "_", "cb", "cachebust", "cachebuster", "nocache", "rnd", "random", "ts", "timestamp",
+    "ref", "source", "listening-from-radio-garden",
+}
+
+# Name tokens naming a codec or playlist format, the marker of a per-stream listing
+CODEC_TOKENS = {"mp3", "aac", "aacplus", "heaac", "ogg", "opus", "flac", "hls", "m3u", "m3u8", "pls"}
+
+# Name tokens that describe stream quality, but only next to a codec or bitrate
+# marker; on their own they are ordinary words ("Radio High", "Stream FM")
+QUALITY_TOKENS = CODEC_TOKENS | {
+    "hq", "lq", "hd", "sd", "hifi", "lofi", "low", "high", "mobile", "stream", "ssl", "https", "http",
+}
+
+# Words too common to tell stations apart, ignored when names are compared fuzzily
+FILLER_TOKENS = {"radio", "rádio", "radyo", "fm", "am", "the", "online", "web", "live", "station"}
+
+_BITRATE_RE = re.compile(r"\b\d{2,3}\s*(?:k|kb|kbs|kbps|kbit|kbits)\b")
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a stream URL for duplicate detection.
+
+    The scheme, `www.`, default ports, trailing slashes and tracking
+    parameters are dropped, so http/https copies of one stream compare equal.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip().lower()
+
+    host = (parts.hostname or '').lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+    path = parts.path
+    if '//' in path:
+        path = re.sub(r'/{2,}', '/', path)
+    path = path.rstrip('/')
+    if not parts.query:
+        return f"{netloc}{path}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    )
+    return f"{netloc}{path}?{urlencode(query)}" if query else f"{netloc}{path}"
+
+
+def normalize_name(name: str) -> str:
+    """Station name without case, accents, punctuation or stream quality markers"""
+    text = name
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold().replace('_', ' ')
+    tokens = _TOKEN_RE.findall(text)
+    if not _BITRATE_RE.search(text) and CODEC_TOKENS.isdisjoint(tokens):
+        return ' '.join(tokens)
+
+    stripped = _TOKEN_RE.findall(_BITRATE_RE.sub(' ', text))
+    stripped = [token for token in stripped if token not in QUALITY_TOKENS]
+    # Never boil a name down to filler words ("Opus FM" stays "opus fm")
+    if all(_is_filler(token) for token in stripped):
+        return ' '.join(tokens)
+    return ' '.join(stripped)
+
+
+@lru_cache(maxsize=65536)
+def _is_filler(token: str) -> bool:
+    """Filler words, including misspellings of the longer ones ("radi0")"""
+    if token in FILLER_TOKENS:
+        return True
+    return len(token) >= 4 and any(
+        len(filler) >= 4 and SequenceMatcher(None, token, filler).ratio() >= 0.8
+        for filler in FILLER_TOKENS
+    )
+
+
+def _loose_name(name_key: str) -> str:
+    """Name key without quality words even where no codec or bitrate marks them"""
+    tokens = [token for token in name_key.split() if token not in QUALITY_TOKENS]
+    if all(_is_filler(token) for token in tokens):
+        return name_key
+    return ' '.join(tokens)
+
+
+def _core_name(name_key: str) -> str:
+    tokens = [token for token in name_key.split() if not _is_filler(token)]
+    return ' '.join(tokens) or name_key
+
+
+def _digits(name_key: str) -> Tuple[str, ...]:
+    return tuple(token for token in name_key.split() if token.isdigit())
+
+
+class DedupReport:
+    """What collapsing duplicates saved on one batch of stations"""
+
+    def __init__(self, stations_in: int = 0, stations_out: int = 0, distinct_urls_in: int = 0,
+                 stations_with_variants: int = 0):
+        self.stations_in = stations_in
+        self.stations_out = stations_out
+        # Health checks probe every distinct listed URL without dedup, one per station with it
+        self.distinct_urls_in = distinct_urls_in
+        self.stations_with_variants = stations_with_variants
+
+    @property
+    def duplicates_removed(self) -> int:
+        return self.stations_in - self.stations_out
+
+    def summary(self) -> dict:
+        return {
+            "stations_in": self.stations_in,
+            "stations_out": self.stations_out,
+            "duplicates_removed": self.duplicates_removed,
+            "stations_with_variants": self.stations_with_variants,
+            "catalog_reduction": round(self.duplicates_removed / self.stations_in, 4) if self.stations_in else 0.0,
+            "probes_before": self.distinct_urls_in,
+            "probes_after": self.stations_out,
+            "probes_saved": self.distinct_urls_in - self.stations_out,
+        }
+
+
+def _loose_url(url: str) -> str:
+    """Cheaper normalization for homepage and favicon URLs, which are only compared"""
+    url = url.strip().lower()
+    for prefix in ("https://", "http://", "www."):
+        if url.startswith(prefix):
+            url = url[len(prefix):]
+    return url.rstrip('/')
+
+
+def _stream_option(station: RadioStation) -> Tuple[Optional[str], int]:
+    return ((station.codec or '').strip().upper() or None, station.bitrate or 0)
+
+
+def _evidence(station: RadioStation, url_key: str) -> Set[tuple]:
+    """Signals that two listings come from the same broadcaster"""
+    evidence = {("host", url_key.split('/', 1)[0])}
+    for field in ("homepage", "favicon"):
+        value = _loose_url(getattr(station, field) or '')
+        if value:
+            evidence.add((field, value))
+    return evidence
+
+
+class StationDeduplicator:
+    """Collapses near-duplicate Radio Browser listings into one canonical station.
+
+    Listings with the same normalized stream URL are merged outright. The
+    resulting clusters are then matched on name within a country, exactly on
+    the hashed name key or fuzzily without filler words, blocked by name
+    prefix and the numbers in the name so only plausible pairs are compared
+    and "Radio 1" never matches "Radio 10". A name match only merges when the
+    listings also share a stream host, homepage or favicon. Names that differ
+    only by quality words ("Radio 1 HQ") also merge on that evidence when the
+    listing streams another bitrate or codec. Each cluster
+    becomes its most popular listing, carrying the distinct bitrate/codec
+    options as `variants`.
+    """
+
+    def __init__(self, name_threshold: float = 0.88, token_threshold: float = 0.85, max_block: int = 200):
+        self.name_threshold = name_threshold
+        self.token_threshold = token_threshold
+        self.max_block = max_block
+
+    def dedupe(self, stations: List[RadioStation]) -> Tuple[List[RadioStation], Dict[str, str], DedupReport]:
+        """Return canonical stations in input order, a duplicate id -> canonical id map, and a report"""
+        parent = list(range(len(stations)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(a: int, b: int):
+            a, b = find(a), find(b)
+            if a != b:
+                # Keep the earliest listing as root so clusters stay in input order
+                parent[max(a, b)] = min(a, b)
+
+        url_keys = [normalize_url(station.url) for station in stations]
+        name_keys = [normalize_name(station.name) for station in stations]
+
+        seen: Dict[str, int] = {}
+        for i, url_key in enumerate(url_keys):
+            first = seen.setdefault(url_key, i)
+            if first != i:
+                union(first, i)
+
+        evidence: Dict[int, Set[tuple]] = {}
+        options: Dict[int, Set[tuple]] = {}
+        for i, station in enumerate(stations):
+            root = find(i)
+            evidence.setdefault(root, set()).update(_evidence(station, url_keys[i]))
+            options.setdefault(root, set()).add(_stream_option(station))
+
+        self._match_names(stations, name_keys, evidence, options, union)
+
+        clusters: Dict[int, List[int]] = {}
+        for i in range(len(stations)):
+            clusters.setdefault(find(i), []).append(i)
+
+        canonical: List[RadioStation] = []
+        aliases: Dict[str, str] = {}
+        with_variants = 0
+        for members in clusters.values():
+            station = self._merge([stations[i] for i in members], [url_keys[i] for i in members])
+            canonical.append(station)
+            if station.variants:
+                with_variants += 1
+            for i in members:
+                if stations[i].id != station.id:
+                    aliases[stations[i].id] = station.id
+
+        report = DedupReport(
+            stations_in=len(stations),
+            stations_out=len(canonical),
+            distinct_urls_in=len({station.url for station in stations}),
+            stations_with_variants=with_variants,
+        )
+        return canonical, aliases, report
+
+    def _similar(self, a: str, b: str) -> bool:
+        matcher = SequenceMatcher(None, a, b)
+        if not (matcher.real_quick_ratio() >= self.name_threshold
+                and matcher.quick_ratio() >= self.name_threshold
+                and matcher.ratio() >= self.name_threshold):
+            return False
+        # Every differing word must be a misspelling of one on the other side,
+        # so "Energy Berlin" / "Energy Bern" stay apart despite the overall score
+        a_tokens, b_tokens = a.split(), b.split()
+        if len(a_tokens) != len(b_tokens):
+            return False
+        a_only = [t for t in a_tokens if t not in b_tokens]
+        b_only = [t for t in b_tokens if t not in a_tokens]
+        return all(
+            any(SequenceMatcher(None, token, other).ratio() >= self.token_threshold for other in b_only)
+            for token in a_only
+        )
+
+    def _match_names(self, stations: List[RadioStation], name_keys: List[str],
+                     evidence: Dict[int, Set[tuple]], options: Dict[int, Set[tuple]], union):
+        blocks: Dict[tuple, List[Tuple[int, str, str, Set[tuple], Set[tuple]]]] = {}
+        for root in sorted(evidence):
+            name = name_keys[root]
+            core = _core_name(name)
+            loose = _core_name(_loose_name(name))
+            block = blocks.setdefault((stations[root].countrycode.upper(), _digits(name), loose[:3]), [])
+            for other, other_core, other_loose, other_evidence, other_options in block[:self.max_block]:
+                if other_evidence.isdisjoint(evidence[root]):
+                    continue
+                if (core == other_core or self._similar(core, other_core)
+                        or (loose == other_loose and not options[root] <= other_options)):
+                    union(other, root)
+                    other_evidence.update(evidence[root])
+                    other_options.update(options[root])
+                    break
+            else:
+                block.append((root, core, loose, evidence[root], options[root]))
+
+    @staticmethod
+    def _rank(station: RadioStation) -> tuple:
+        return (station.lastcheckok, station.clickcount, station.votes, station.url.startswith('https://'))
+
+    def _merge(self, members: List[RadioStation], url_keys: List[str]) -> RadioStation:
+        best = max(members, key=self._rank)
+        if len(members) == 1:
+            return best
+
+        update: Dict[str, object] = {}
+        # Prefer an https copy of the same stream so it plays on https pages
+        if not best.url.startswith('https://'):
+            best_key = url_keys[members.index(best)]
+            for member, key in zip(members, url_keys):
+                if key == best_key and member.url.startswith('https://'):
+                    update["url"] = member.url
+                    break
+
+        options: Dict[Tuple[Optional[str], int], RadioStation] = {}
+        for member in members:
+            option = _stream_option(member)
+            current = options.get(option)
+            if current is None or self._rank(member) > self._rank(current):
+                options[option] = member
+        if len(options) > 1:
+            update["variants"] = [
+                StationVariant(
+                    id=member.id,
+                    url=update["url"] if member is best and "url" in update else member.url,
+                    codec=codec,
+                    bitrate=bitrate or None,
+                )
+                for (codec, bitrate), member in sorted(options.items(), key=lambda item: -item[0][1])
+            ]
+        return best.model_copy(update=update) if update else best
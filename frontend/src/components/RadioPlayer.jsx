@@ -4,6 +4,7 @@ import { Button } from './ui/button';
 import { Card, CardContent } from './ui/card';
 import { Slider } from './ui/slider';
 import { Badge } from './ui/badge';
+import { radioApi } from '../services/radioApi';
 
 const RadioPlayer = ({ station, onClose }) => {
   const [isPlaying, setIsPlaying] = useState(false);
@@ -29,6 +30,8 @@ const RadioPlayer = ({ station, onClose }) => {
         setIsPlaying(false);
       }
     } else {
+      // Play counts feed trending rankings, never block playback on them
+      radioApi.recordPlay(station.id).catch(() => {});
       // Mock playing - in real implementation, this would connect to actual stream
       setTimeout(() => {
         setIsPlaying(true);
@@ -38,6 +38,16 @@ export const radioApi = {
     }
   },
 
+  async recordPlay(stationId) {
+    try {
+      const response = await fetch(`${API_BASE}/stations/${stationId}/play`, { method: 'POST' });
+      return await handleResponse(response);
+    } catch (error) {
+      console.error(`Failed to record play for ${stationId}:`, error);
+      throw error;
+    }
+  },
+
   async validateStation(stationId) {
     try {
       const response = await fetch(`${API_BASE}/stations/${stationId}/validate`);
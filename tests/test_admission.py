@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import AdmissionControlMiddleware, TokenBucketLimiter, remaining_time
+
+
+def make_scope(client="10.0.0.1", forwarded_for=None):
+    headers = []
+    if forwarded_for is not None:
+        headers.append((b"x-forwarded-for", forwarded_for.encode("latin-1")))
+    return {"type": "http", "method": "GET", "path": "/api/stations", "headers": headers,
+            "client": (client, 50000)}
+
+
+async def call(middleware, scope=None):
+    """Drive one request through the middleware and return (status, headers)"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await middleware(scope or make_scope(), receive, send)
+    start = messages[0]
+    return start["status"], dict(start["headers"])
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"[]"})
+
+
+def test_token_bucket_refills_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    limiter = TokenBucketLimiter(rate=2.0, burst=2.0)
+
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == pytest.approx(0.5)
+    # Other clients have their own bucket
+    assert limiter.acquire("b") == 0.0
+
+    now[0] += 0.5
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") > 0
+
+    # Refill is capped at the burst size
+    now[0] += 60
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") == 0.0
+    assert limiter.acquire("a") > 0
+
+
+def test_rate_limited_requests_get_429_with_retry_after():
+    middleware = AdmissionControlMiddleware(ok_app, rate=1.0, burst=1.0)
+
+    async def run():
+        return [await call(middleware) for _ in range(2)]
+
+    (first, _), (second, headers) = asyncio.run(run())
+    assert first == 200
+    assert second == 429
+    assert headers[b"retry-after"] == b"1"
+    assert middleware.rejected["rate_limited"] == 1
+
+
+def test_rate_limit_is_off_by_default():
+    middleware = AdmissionControlMiddleware(ok_app)
+
+    async def run():
+        return [await call(middleware) for _ in range(100)]
+
+    assert middleware.limiter is None
+    assert all(status == 200 for status, _ in asyncio.run(run()))
+
+
+@pytest.mark.parametrize("hops, forwarded_for, expected", [
+    # Without trusted hops the header is ignored, it may be forged
+    (0, "1.1.1.1", "10.0.0.1"),
+    # The right-most entry is the one our proxy appended
+    (1, "6.6.6.6, 1.1.1.1", "1.1.1.1"),
+    (2, "6.6.6.6, 1.1.1.1, 172.16.0.2", "1.1.1.1"),
+    # Fewer hops than proxies means the request bypassed one of them
+    (2, "1.1.1.1", "10.0.0.1"),
+    (1, None, "10.0.0.1"),
+])
+def test_client_key_trusts_only_proxy_hops(hops, forwarded_for, expected):
+    middleware = AdmissionControlMiddleware(ok_app, trusted_proxy_hops=hops)
+    assert middleware._client_key(make_scope(forwarded_for=forwarded_for)) == expected
+
+
+def test_spoofed_forwarded_for_does_not_escape_the_limit():
+    middleware = AdmissionControlMiddleware(ok_app, rate=1.0, burst=1.0, trusted_proxy_hops=1)
+
+    async def run():
+        return [
+            await call(middleware, make_scope(forwarded_for=f"9.9.9.{i}, 1.1.1.1"))
+            for i in range(2)
+        ]
+
+    statuses = [status for status, _ in asyncio.run(run())]
+    assert statuses == [200, 429]
+
+
+def test_full_queue_gets_503_with_retry_after():
+    release = None
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await ok_app(scope, receive, send)
+
+    middleware = AdmissionControlMiddleware(slow_app, max_concurrent=1, max_queued=1, queue_timeout=2.0)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        running = asyncio.ensure_future(call(middleware))
+        queued = asyncio.ensure_future(call(middleware))
+        await asyncio.sleep(0.01)
+        rejected = await call(middleware)
+        release.set()
+        return rejected, await running, await queued
+
+    (status, headers), running, queued = asyncio.run(run())
+    assert status == 503
+    assert headers[b"retry-after"] == b"2"
+    assert running[0] == queued[0] == 200
+    assert middleware.rejected["queue_full"] == 1
+
+
+def test_queue_timeout_gets_503_with_retry_after():
+    release = None
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await ok_app(scope, receive, send)
+
+    middleware = AdmissionControlMiddleware(slow_app, max_concurrent=1, max_queued=4, queue_timeout=0.05)
+
+    async def run():
+        nonlocal release
+        release = asyncio.Event()
+        running = asyncio.ensure_future(call(middleware))
+        await asyncio.sleep(0.01)
+        rejected = await call(middleware)
+        release.set()
+        return rejected, await running
+
+    (status, headers), running = asyncio.run(run())
+    assert status == 503
+    assert headers[b"retry-after"] == b"1"
+    assert running[0] == 200
+    assert middleware.rejected["queue_timeout"] == 1
+    assert middleware._queued == 0
+
+
+def test_deadline_exceeded_gets_503():
+    seen = {}
+
+    async def hanging_app(scope, receive, send):
+        seen["remaining"] = remaining_time()
+        await asyncio.sleep(10)
+
+    middleware = AdmissionControlMiddleware(hanging_app, deadline=0.05, deadline_grace=0.0)
+    status, headers = asyncio.run(call(middleware))
+
+    assert status == 503
+    assert headers[b"retry-after"] == b"1"
+    assert 0 < seen["remaining"] <= 0.05
+    assert middleware.rejected["deadline"] == 1
+    assert remaining_time() is None
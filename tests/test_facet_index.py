@@ -0,0 +1,54 @@
+import json
+
+from models import RadioStation
+from services.facet_index import FacetIndex
+
+
+def make_station(station_id, genre, codec="MP3", bitrate=128, countrycode="GB", language="english"):
+    return RadioStation(
+        id=station_id, name=station_id, frequency="100.0 FM", genre=genre, url=f"http://s/{station_id}",
+        listeners="0", description="", country="", countrycode=countrycode, language=language,
+        codec=codec, bitrate=bitrate,
+    )
+
+
+STATIONS = [
+    make_station("a", "Rock"),
+    make_station("b", "Rock", codec="AAC", bitrate=64),
+    make_station("c", "Jazz", countrycode="DE", language="german"),
+    make_station("d", "Pop", bitrate=320, language="english,german"),
+]
+
+
+def query(index, filters):
+    return json.loads(index.query(filters))
+
+
+def test_bulk_and_incremental_builds_agree():
+    bulk = FacetIndex(bulk_threshold=1)
+    incremental = FacetIndex(bulk_threshold=10**6)
+    for index in (bulk, incremental):
+        index.apply(STATIONS, [])
+        index.apply([make_station("b", "Jazz", codec="AAC")], ["d"])
+
+    for filters in ({}, {"genre": ["Jazz"]}, {"codec": ["AAC"], "country": ["GB"]}):
+        assert query(bulk, filters) == query(incremental, filters)
+    assert query(bulk, {})["total"] == 3
+
+
+def test_filters_match_case_insensitively():
+    index = FacetIndex()
+    index.apply(STATIONS, [])
+    result = query(index, {"genre": ["rock"], "codec": ["mp3"]})
+    assert result["total"] == 1
+    assert result["filters"] == {"codec": ["MP3"], "genre": ["Rock"]}
+    assert {"value": "Rock", "count": 1} in result["facets"]["genre"]
+
+
+def test_counts_ignore_the_facets_own_filter():
+    index = FacetIndex()
+    index.apply(STATIONS, [])
+    result = query(index, {"genre": ["Rock"]})
+    assert result["total"] == 2
+    genres = {item["value"]: item["count"] for item in result["facets"]["genre"]}
+    assert genres == {"Rock": 2, "Jazz": 1, "Pop": 1}
@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from models import RadioStation
+from services.geo_index import GeoIndex, haversine_km
+
+
+def make_station(station_id, lat, lon):
+    return RadioStation(
+        id=station_id, name=station_id, frequency="100.0 FM", genre="Music", url=f"http://s/{station_id}",
+        listeners="0", description="", country="", countrycode="XX", geo_lat=lat, geo_long=lon,
+    )
+
+
+@pytest.fixture(scope="module")
+def stations():
+    rng = random.Random(7)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(2000)]
+    # Clusters near the poles and on both sides of the antimeridian
+    points += [(rng.uniform(85, 90), rng.uniform(-180, 180)) for _ in range(100)]
+    points += [(rng.uniform(-10, 10), rng.choice((-1, 1)) * rng.uniform(179, 180)) for _ in range(100)]
+    return [make_station(str(i), lat, lon) for i, (lat, lon) in enumerate(points)]
+
+
+def brute_force(stations, lat, lon, radius_km, limit):
+    hits = sorted(
+        (haversine_km(lat, lon, s.geo_lat, s.geo_long), s.id) for s in stations
+    )
+    return [(d, station_id) for d, station_id in hits if d <= radius_km][:limit]
+
+
+@pytest.mark.parametrize("bulk_threshold", [1, 10**6])
+def test_nearest_matches_brute_force(stations, bulk_threshold):
+    index = GeoIndex(bulk_threshold=bulk_threshold)
+    index.apply(stations, [])
+    rng = random.Random(11)
+    queries = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(40)]
+    queries += [(90, 0), (-90, 45), (0, 180), (0, -180), (5, 179.9), (89.5, -179.5)]
+    for lat, lon in queries:
+        for radius_km, limit in ((50, 5), (1500, 10), (20000, 20)):
+            expected = brute_force(stations, lat, lon, radius_km, limit)
+            actual = [(d, s.id) for d, s in index.nearest(lat, lon, radius_km, limit)]
+            assert [round(d, 6) for d, _ in actual] == [round(d, 6) for d, _ in expected], (lat, lon, radius_km)
+
+
+def test_updates_and_removals(stations):
+    index = GeoIndex()
+    index.apply(stations[:10], [])
+    index.apply([make_station("0", 51.5, -0.1)], ["1"])
+    ids = {s.id for _, s in index.nearest(51.5, -0.1, 20000, 100)}
+    assert "1" not in ids and len(ids) == 9
+    assert index.nearest(51.5, -0.1, 1, 1)[0][1].id == "0"
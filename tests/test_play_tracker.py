@@ -0,0 +1,124 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+from services.play_tracker import PlayTracker
+
+
+class FakeCollection:
+    """Applies `$inc` bulk writes to a dict, optionally failing or blocking"""
+
+    def __init__(self):
+        self.plays = {}
+        self.calls = 0
+        self.reject = set()
+        self.error = None
+        self.block = None
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls += 1
+        if self.block is not None:
+            await self.block.wait()
+        if self.error is not None:
+            raise self.error
+        errors = []
+        for index, operation in enumerate(operations):
+            station_id = operation._filter["_id"]
+            if station_id in self.reject:
+                errors.append({"index": index, "code": 11000, "errmsg": "rejected"})
+                continue
+            self.plays[station_id] = self.plays.get(station_id, 0) + operation._doc["$inc"]["plays"]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": 0})
+
+
+def test_flush_writes_counts_and_empties_shards():
+    collection = FakeCollection()
+    tracker = PlayTracker(collection, shards=4)
+    for station_id in ["a", "b", "a", "c"]:
+        tracker.record(station_id)
+
+    assert asyncio.run(tracker.flush()) == 3
+    assert collection.plays == {"a": 2, "b": 1, "c": 1}
+    assert tracker.pending == 0
+
+
+def test_partial_bulk_failure_retries_only_rejected_updates():
+    collection = FakeCollection()
+    collection.reject = {"b"}
+    tracker = PlayTracker(collection, shards=1)
+    for station_id in ["a", "b", "b", "c"]:
+        tracker.record(station_id)
+
+    assert asyncio.run(tracker.flush()) == 2
+    assert collection.plays == {"a": 1, "c": 1}
+    assert tracker.pending == 1
+
+    collection.reject = set()
+    asyncio.run(tracker.flush())
+    assert collection.plays == {"a": 1, "b": 2, "c": 1}
+
+
+def test_unreachable_database_stops_after_first_shard():
+    collection = FakeCollection()
+    collection.error = ServerSelectionTimeoutError("no servers")
+    tracker = PlayTracker(collection, shards=16)
+    for i in range(200):
+        tracker.record(f"station-{i}")
+
+    assert asyncio.run(tracker.flush()) == 0
+    assert collection.calls == 1
+    assert tracker.pending == 200
+
+    collection.error = None
+    asyncio.run(tracker.flush())
+    assert sum(collection.plays.values()) == 200
+
+
+def test_close_keeps_counts_of_an_interrupted_flush():
+    collection = FakeCollection()
+    tracker = PlayTracker(collection, shards=1, flush_interval=0)
+    for station_id in ["a", "a", "b"]:
+        tracker.record(station_id)
+
+    async def run():
+        collection.block = asyncio.Event()
+        tracker.start()
+        # Wait until the background flush has swapped the shard out
+        while collection.calls == 0:
+            await asyncio.sleep(0)
+        assert tracker.pending == 0
+        collection.block = None
+        await tracker.close()
+
+    asyncio.run(run())
+    assert collection.plays == {"a": 2, "b": 1}
+    assert tracker.pending == 0
+
+
+def test_trending_filters_before_the_limit():
+    tracker = PlayTracker(FakeCollection())
+    for station_id in ["removed", "removed", "live"]:
+        tracker.record(station_id)
+
+    assert tracker.trending(3600, 1) == [("removed", 2)]
+    assert tracker.trending(3600, 1, include=lambda station_id: station_id != "removed") == [("live", 1)]
+
+
+def test_sort_by_trending_reuses_the_cached_counts(monkeypatch):
+    class Station:
+        def __init__(self, id):
+            self.id = id
+
+    tracker = PlayTracker(FakeCollection())
+    for station_id in ["b", "b", "c"]:
+        tracker.record(station_id)
+    stations = [Station("a"), Station("b"), Station("c")]
+    assert [s.id for s in tracker.sort_by_trending(stations)] == ["b", "c", "a"]
+
+    def fail(*args):
+        raise AssertionError("window counts recomputed")
+
+    monkeypatch.setattr(tracker, "window_counts", fail)
+    assert [s.id for s in tracker.sort_by_trending(stations)] == ["b", "c", "a"]
+    assert tracker.trending(3600, 2) == [("b", 2), ("c", 1)]
@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from profiling import (
+    ProfiledRoute, ProfileStore, ProfilingMiddleware, RequestProfile, StackSampler, current_profile, span,
+)
+
+ADMIN_TOKEN = "secret-token"
+
+store = ProfileStore()
+router = APIRouter(prefix="/api", route_class=ProfiledRoute)
+
+
+@router.get("/stations/{country_code}")
+async def get_stations(country_code: str):
+    with span("cache_lookup"):
+        await asyncio.sleep(0)
+    profile = current_profile()
+    if profile is not None:
+        profile.record("validate", 0.001)
+    return [{"country": country_code}]
+
+
+app = FastAPI()
+app.include_router(router)
+app.add_middleware(ProfilingMiddleware, admin_token=ADMIN_TOKEN, store=store, sampler=StackSampler())
+client = TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_store():
+    store.clear()
+
+
+def test_profiled_request_reports_spans():
+    response = client.get("/api/stations/DE", headers={"X-Profile": "1", "X-Admin-Token": ADMIN_TOKEN})
+
+    assert response.status_code == 200
+    profile = store.get(response.headers["x-profile-id"])
+    assert profile is not None
+    assert profile.status == 200
+    assert {"endpoint", "endpoint;cache_lookup", "endpoint;validate", "serialize"} <= set(profile.spans)
+    assert profile.spans["endpoint;validate"] == pytest.approx(0.001)
+
+    timing = response.headers["server-timing"]
+    assert "endpoint;dur=" in timing and "serialize;dur=" in timing
+    # Only top-level spans go into Server-Timing
+    assert "cache_lookup" not in timing
+
+
+@pytest.mark.parametrize("headers", [
+    {"X-Profile": "1"},
+    {"X-Profile": "1", "X-Admin-Token": "wrong"},
+    {"X-Admin-Token": ADMIN_TOKEN},
+])
+def test_profile_header_without_valid_token_is_ignored(headers):
+    response = client.get("/api/stations/DE", headers=headers)
+
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+    assert "server-timing" not in response.headers
+    assert len(store.profiles) == 0
+
+
+def test_profiled_route_names_the_profile():
+    response = client.get("/api/stations/FR", headers={"X-Profile": "1", "X-Admin-Token": ADMIN_TOKEN})
+
+    profile = store.get(response.headers["x-profile-id"])
+    assert profile.route == "/api/stations/{country_code}"
+    assert profile.root == "GET /api/stations/{country_code}"
+
+
+def test_folded_reports_self_time():
+    profile = RequestProfile("GET", "/api/stations/DE")
+    profile.route = "/api/stations/{country_code}"
+    profile.spans = {
+        "endpoint": 0.010,
+        "endpoint;upstream_fetch": 0.004,
+        "endpoint;upstream_fetch;upstream_decode": 0.001,
+        "endpoint;cache_lookup": 0.002,
+        "serialize": 0.001,
+    }
+    profile.duration_ms = 15.0
+
+    root = "GET /api/stations/{country_code}"
+    assert sorted(profile.folded()) == sorted([
+        f"{root};endpoint 4000",
+        f"{root};endpoint;upstream_fetch 3000",
+        f"{root};endpoint;upstream_fetch;upstream_decode 1000",
+        f"{root};endpoint;cache_lookup 2000",
+        f"{root};serialize 1000",
+        # Request time outside any top-level span
+        f"{root} 4000",
+    ])
+
+
+def test_store_merges_profiles_by_route():
+    for route, seconds in [("/a", 0.001), ("/a", 0.002), ("/b", 0.004)]:
+        profile = RequestProfile("GET", route)
+        profile.route = route
+        profile.spans = {"endpoint": seconds}
+        store.add(profile)
+
+    assert store.folded(route="/a") == "GET /a;endpoint 3000\n"
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+import admission
+from benchmarks.fake_radio_browser import FakeUpstreamConfig, FakeUpstreamStats, create_fake_radio_browser
+from models import RadioBrowserStation
+from services.radio_service import RadioBrowserService
+
+
+def make_service(latency_ms: float = 0.0, error_rate: float = 0.0, **kwargs):
+    stats = FakeUpstreamStats()
+    config = FakeUpstreamConfig(stations_per_country=20, latency_ms=latency_ms, latency_jitter_ms=0,
+                                error_rate=error_rate)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_fake_radio_browser(config, stats)))
+    service = RadioBrowserService(base_url="http://fake/json", client=client, **kwargs)
+    return service, stats
+
+
+def with_deadline(seconds: float):
+    admission._deadline.set(time.monotonic() + seconds)
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    service, stats = make_service(latency_ms=50)
+
+    async def run():
+        results = await asyncio.gather(*(service.get_stations_by_country("DE", 10) for _ in range(200)))
+        await service.close()
+        return results
+
+    results = asyncio.run(run())
+    assert stats.requests == 1
+    assert len(results[0]) == 10
+    assert all(result is results[0] for result in results)
+
+
+def test_stale_copy_is_served_at_once_and_refreshed_in_background():
+    service, stats = make_service(latency_ms=200)
+    stale = ["stale"]
+    service.stale_cache["stations_DE_10"] = stale
+
+    async def run():
+        with_deadline(5.0)
+        start = time.perf_counter()
+        first = await service.get_stations_by_country("DE", 10)
+        second = await service.get_stations_by_country("DE", 10)
+        elapsed = time.perf_counter() - start
+        # The refresh runs detached from the request and fills the cache
+        await asyncio.gather(*service._inflight.values())
+        refreshed = await service.get_stations_by_country("DE", 10)
+        await service.close()
+        return first, second, elapsed, refreshed
+
+    first, second, elapsed, refreshed = asyncio.run(run())
+    assert first is stale and second is stale
+    assert elapsed < 0.1
+    assert stats.requests == 1
+    assert len(refreshed) == 10
+
+
+def test_failed_refresh_backs_off_and_logs_the_error(caplog):
+    service, stats = make_service(error_rate=1.0)
+    stale = ["stale"]
+    service.stale_cache["stations_DE_10"] = stale
+
+    async def run():
+        results = []
+        for _ in range(5):
+            results.append(await service.get_stations_by_country("DE", 10))
+            await asyncio.gather(*service._inflight.values())
+        await service.close()
+        return results
+
+    with caplog.at_level(logging.ERROR):
+        results = asyncio.run(run())
+    assert all(result is stale for result in results)
+    assert stats.requests == 1
+    assert "Failed to fetch stations for DE: HTTPStatusError(" in caplog.text
+
+
+def test_miss_without_stale_copy_gives_up_at_the_deadline():
+    service, stats = make_service(latency_ms=2000)
+
+    async def run():
+        with_deadline(0.1)
+        start = time.perf_counter()
+        stations = await service.get_stations_by_country("DE", 10)
+        elapsed = time.perf_counter() - start
+        await service.close()
+        return stations, elapsed
+
+    stations, elapsed = asyncio.run(run())
+    assert stations == []
+    assert elapsed < 0.5
+
+
+def test_country_fetch_makes_stations_similar_without_a_catalog_refresh():
+    service, _ = make_service(similarity_debounce=0.01)
+
+    async def run():
+        stations = await service.get_stations_by_country("DE", 10)
+        while service._similarity_task is not None and not service._similarity_task.done():
+            await asyncio.sleep(0.01)
+        await service.close()
+        return stations
+
+    stations = asyncio.run(run())
+    assert not service.similarity_index.has_pending
+    for station in stations:
+        assert service.get_similar_stations(station.id, 5) is not None
+
+
+def test_transform_station_needs_no_service_instance():
+    station = RadioBrowserService._transform_station(RadioBrowserStation(
+        stationuuid="x", name="Jazz One", url="http://a.example/live", country="Germany", countrycode="DE",
+        tags="jazz,smooth", clickcount=1500,
+    ))
+    assert (station.id, station.genre, station.listeners) == ("x", "Jazz", "2K")
+    assert station.description == "Jazz, Smooth from Germany"
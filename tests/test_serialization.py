@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+import msgpack
+import pytest
+from fastapi import FastAPI, Header
+from fastapi.responses import Response
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+
+from serialization import parse_accept, render_stations, wants_msgpack
+
+
+class Item(BaseModel):
+    id: str
+    name: str
+
+
+ITEMS = [Item(id="1", name="One"), Item(id="2", name="Two")]
+
+app = FastAPI()
+
+
+@app.get("/items", response_model=List[Item])
+async def get_items(response: Response, fields: Optional[str] = None, accept: Optional[str] = Header(None)):
+    return render_stations(ITEMS, Item, fields, accept, response)
+
+
+client = TestClient(app)
+
+
+def test_parse_accept_reads_q_values():
+    assert parse_accept("application/json, application/msgpack;q=0.5, */*; q=0") == {
+        "application/json": 1.0,
+        "application/msgpack": 0.5,
+        "*/*": 0.0,
+    }
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, False),
+    ("*/*", False),
+    ("application/json", False),
+    ("application/msgpack", True),
+    ("application/x-msgpack", True),
+    ("Application/MsgPack", True),
+    ("application/json, application/msgpack", True),
+    # q=0 means "not acceptable"
+    ("application/json, application/msgpack;q=0", False),
+    ("application/msgpack;q=0", False),
+    ("application/msgpack;q=0.5, application/json", False),
+    ("application/msgpack, application/json;q=0.9", True),
+    ("application/msgpack;q=0.5, */*;q=0.1", True),
+    ("application/msgpack;q=0.5, application/*;q=0.8", False),
+    ("application/msgpack;q=abc", False),
+])
+def test_wants_msgpack_honours_q_values(accept, expected):
+    assert wants_msgpack(accept) is expected
+
+
+@pytest.mark.parametrize("params, headers", [
+    ({}, {}),
+    ({"fields": "id"}, {}),
+    ({}, {"Accept": "application/msgpack"}),
+    ({}, {"Accept": "application/json, application/msgpack;q=0"}),
+])
+def test_every_response_varies_on_accept(params, headers):
+    response = client.get("/items", params=params, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["vary"] == "Accept"
+
+
+def test_q_zero_msgpack_gets_json():
+    response = client.get("/items", headers={"Accept": "application/json, application/msgpack;q=0"})
+    assert response.headers["content-type"].startswith("application/json")
+    assert response.json() == [item.model_dump() for item in ITEMS]
+
+
+def test_msgpack_projection():
+    response = client.get("/items", params={"fields": "name"}, headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content) == [{"name": "One"}, {"name": "Two"}]
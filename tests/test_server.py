@@ -0,0 +1,31 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+import server  # noqa: E402
+
+# Not entered as a context manager, so startup tasks (catalog refresh, play flushes) do not run
+client = TestClient(server.app)
+
+
+@pytest.mark.parametrize("params", [
+    {"lat": "10", "lon": "100", "radius": "nan"},
+    {"lat": "10", "lon": "100", "radius": "inf"},
+    {"lat": "nan", "lon": "100"},
+    {"lat": "10", "lon": "-inf"},
+    {"lat": "91", "lon": "0"},
+    {"lat": "0", "lon": "0", "radius": "0"},
+])
+def test_nearby_rejects_invalid_coordinates(params):
+    response = client.get("/api/stations/nearby", params=params)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("bitrate, status", [("Unknown", 200), ("128-191", 200), ("128-190", 400)])
+def test_facet_bitrate_buckets_match_case_insensitively(bitrate, status):
+    response = client.get("/api/facets", params={"bitrate": bitrate})
+    assert response.status_code == status
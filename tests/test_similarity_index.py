@@ -0,0 +1,71 @@
+import random
+
+import numpy as np
+
+from models import RadioStation
+from services.similarity_index import SimilarityIndex
+
+TAGS = ["pop", "rock", "jazz", "news", "talk", "dance", "house", "chill", "80s", "90s", "indie", "folk"]
+LANGUAGES = ["english", "german", "french", "spanish"]
+
+
+def make_station(station_id: str, rng: random.Random) -> RadioStation:
+    return RadioStation(
+        id=station_id, name=f"Station {station_id}", frequency="100.0 FM", genre="Music",
+        url=f"http://stream.example/{station_id}", listeners="10", description="",
+        country="Germany", countrycode="DE", language=rng.choice(LANGUAGES),
+        tags=",".join(rng.sample(TAGS, rng.randint(1, 4))), clickcount=rng.randint(0, 1000),
+    )
+
+
+def brute_force_scores(index: SimilarityIndex) -> dict:
+    """Top-k scores per station from scoring every pair with the index's own vectors"""
+    ids = list(index._stations)
+    X = index._matrix(ids)
+    scores = (X @ X.T).toarray()
+    np.fill_diagonal(scores, -1.0)
+    expected = {}
+    for row, station_id in enumerate(ids):
+        best = sorted((s for s in scores[row] if s > 0), reverse=True)[:index.top_k]
+        expected[station_id] = [round(float(s), 4) for s in best]
+    return expected
+
+
+def build(n: int = 400, seed: int = 1):
+    rng = random.Random(seed)
+    stations = [make_station(str(i), rng) for i in range(n)]
+    index = SimilarityIndex(top_k=5, batch_size=64)
+    index.apply(stations, [])
+    index.refresh()
+    return index, stations, rng
+
+
+def test_popularity_changes_are_not_queued():
+    index, stations, rng = build()
+    index.apply([s.model_copy(update={"clickcount": s.clickcount + 1, "votes": 7}) for s in stations], [])
+    assert not index.has_pending
+    assert index.refresh() == 0
+
+
+def test_incremental_update_matches_full_rescoring():
+    index, stations, rng = build()
+    changed = [
+        s.model_copy(update={"tags": ",".join(rng.sample(TAGS, 3))}) for s in rng.sample(stations, 20)
+    ]
+    added = [make_station(f"new-{i}", rng) for i in range(5)]
+    removed = [s.id for s in stations[:5]]
+    index.apply(changed + added, removed)
+
+    rescored = index.refresh()
+    # Below rebuild_ratio, so only part of the catalog was rescored
+    assert 0 < rescored < len(index._stations)
+
+    expected = brute_force_scores(index)
+    actual = {
+        station_id: [score for _, score in index.get(station_id, index.top_k)]
+        for station_id in index._stations
+    }
+    assert set(actual) == set(expected)
+    for station_id, scores in expected.items():
+        assert np.allclose(actual[station_id], scores, atol=1e-3), station_id
+    assert all(index.get(station_id, 10) is None for station_id in removed)
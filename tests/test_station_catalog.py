@@ -0,0 +1,56 @@
+import threading
+
+from models import RadioStation
+from services.station_catalog import StationCatalog
+
+
+def make_station(station_id, clickcount=0):
+    return RadioStation(
+        id=station_id, name=station_id, frequency="100.0 FM", genre="Music", url=f"http://s/{station_id}",
+        listeners="0", description="", country="", countrycode="GB", clickcount=clickcount,
+    )
+
+
+class RecordingListener:
+    def __init__(self):
+        self.calls = []
+
+    def apply(self, changed, removed):
+        self.calls.append(([s.id for s in changed], list(removed)))
+
+
+def test_sync_notifies_only_the_difference():
+    catalog = StationCatalog()
+    listener = RecordingListener()
+    catalog.add_listener(listener)
+    catalog.sync([make_station("a"), make_station("b")])
+    catalog.sync([make_station("a"), make_station("c")], aliases={"old": "a"})
+    assert listener.calls == [(["a", "b"], []), (["c"], ["b"])]
+    assert catalog.get("old").id == "a"
+
+
+def test_upsert_during_sync_is_applied_after_it():
+    catalog = StationCatalog()
+    entered, release = threading.Event(), threading.Event()
+
+    class SlowListener(RecordingListener):
+        def apply(self, changed, removed):
+            super().apply(changed, removed)
+            if not entered.is_set():
+                entered.set()
+                release.wait(5)
+
+    listener = SlowListener()
+    catalog.add_listener(listener)
+    worker = threading.Thread(target=catalog.sync, args=([make_station("a")],))
+    worker.start()
+    assert entered.wait(5)
+
+    # Does not block while the sync holds the catalog
+    assert catalog.upsert([make_station("b")]) == 0
+    assert catalog.get("b") is None
+
+    release.set()
+    worker.join(5)
+    assert catalog.get("b") is not None
+    assert listener.calls == [(["a"], []), (["b"], [])]
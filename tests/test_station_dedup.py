@@ -0,0 +1,142 @@
+import pytest
+
+from models import RadioStation
+from services.station_dedup import StationDeduplicator, normalize_name, normalize_url
+
+
+def make_station(station_id, name, url, countrycode="GB", codec="MP3", bitrate=128, clickcount=10,
+                 homepage=None, favicon=None):
+    return RadioStation(
+        id=station_id, name=name, frequency="100.0 FM", genre="Pop", url=url, listeners="10",
+        description="", homepage=homepage, favicon=favicon, country="United Kingdom",
+        countrycode=countrycode, codec=codec, bitrate=bitrate, clickcount=clickcount, lastcheckok=1,
+    )
+
+
+def dedupe(*stations):
+    canonical, aliases, report = StationDeduplicator().dedupe(list(stations))
+    return canonical, aliases, report
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("http://stream.example.com/live", "stream.example.com/live"),
+    ("HTTPS://WWW.Stream.Example.com:443/live/", "stream.example.com/live"),
+    ("http://stream.example.com:80//live", "stream.example.com/live"),
+    ("http://stream.example.com:8000/live", "stream.example.com:8000/live"),
+    ("http://stream.example.com/live?utm_source=x&b=2&a=1&_=123", "stream.example.com/live?a=1&b=2"),
+    ("http://stream.example.com/live?nocache=1", "stream.example.com/live"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("BBC Radio 1 (128k)", "bbc radio 1"),
+    ("BBC Radio 1 - AAC", "bbc radio 1"),
+    ("BBC RADIO 1 MP3 HQ 320kbps", "bbc radio 1"),
+    ("Rádio Comercial", "radio comercial"),
+    # Quality words are only dropped next to a codec or bitrate marker
+    ("Stream FM", "stream fm"),
+    ("Radio High", "radio high"),
+    # ...and never leave only filler words behind
+    ("Opus FM", "opus fm"),
+])
+def test_normalize_name(name, expected):
+    assert normalize_name(name) == expected
+
+
+def test_http_and_https_copies_collapse():
+    canonical, aliases, _ = dedupe(
+        make_station("a", "Capital FM", "http://stream.capital.co.uk/live", clickcount=100),
+        make_station("b", "Capital FM", "https://stream.capital.co.uk/live/"),
+    )
+    assert [s.id for s in canonical] == ["a"]
+    assert canonical[0].url == "https://stream.capital.co.uk/live/"
+    assert canonical[0].variants == []
+    assert aliases == {"b": "a"}
+
+
+@pytest.mark.parametrize("variant_name", ["Capital FM (64k)", "Capital FM - AAC"])
+def test_bitrate_and_codec_listings_become_variants(variant_name):
+    canonical, aliases, report = dedupe(
+        make_station("a", "Capital FM", "http://stream.capital.co.uk/live", clickcount=100),
+        make_station("b", variant_name, "http://stream.capital.co.uk/live-64.aac", codec="AAC", bitrate=64),
+    )
+    assert len(canonical) == 1
+    assert [(v.id, v.codec, v.bitrate) for v in canonical[0].variants] == [("a", "MP3", 128), ("b", "AAC", 64)]
+    assert aliases == {"b": "a"}
+    assert report.summary()["duplicates_removed"] == 1
+
+
+def test_fuzzy_name_match_with_shared_homepage():
+    canonical, _, _ = dedupe(
+        make_station("a", "Capital FM London", "http://a.example.com/x", homepage="https://capitalfm.com/"),
+        make_station("b", "Capitol FM London", "http://b.example.net/y", homepage="http://www.capitalfm.com"),
+    )
+    assert len(canonical) == 1
+
+
+@pytest.mark.parametrize("first, second", [
+    ("Stream FM", "Mobile FM"),
+    ("Radio High", "Radio Low"),
+    ("Radio Paradise", "Radio Paradiso"),
+    ("Energy Berlin", "Energy Bern"),
+    ("Radio 1", "Radio 10"),
+])
+@pytest.mark.parametrize("second_url", ["http://stream.two.example/live", "http://stream.one.example/other"])
+def test_distinct_stations_are_kept(first, second, second_url):
+    # Kept apart with and without a shared stream host
+    canonical, aliases, _ = dedupe(
+        make_station("a", first, "http://stream.one.example/live"),
+        make_station("b", second, second_url),
+    )
+    assert [s.id for s in canonical] == ["a", "b"]
+    assert aliases == {}
+
+
+def test_same_name_needs_corroborating_evidence():
+    canonical, _, _ = dedupe(
+        make_station("a", "Jazz FM", "http://jazz.one.example/live", homepage="https://one.example"),
+        make_station("b", "Jazz FM", "http://jazz.two.example/live", homepage="https://two.example"),
+    )
+    assert len(canonical) == 2
+
+    canonical, _, _ = dedupe(
+        make_station("a", "Jazz FM", "http://jazz.one.example/live", favicon="https://jazz.example/icon.png"),
+        make_station("b", "Jazz FM", "http://jazz.two.example/live", favicon="https://jazz.example/icon.png"),
+    )
+    assert len(canonical) == 1
+
+
+def test_same_name_in_other_country_is_kept():
+    canonical, _, _ = dedupe(
+        make_station("a", "Jazz FM", "http://jazz.example/uk", homepage="https://jazz.example"),
+        make_station("b", "Jazz FM", "http://jazz.example/fr", countrycode="FR", homepage="https://jazz.example"),
+    )
+    assert len(canonical) == 2
+
+
+@pytest.mark.parametrize("variant_name", ["Capital FM HQ", "Capital FM Mobile", "Capital Radi0 HQ"])
+def test_quality_word_listing_of_another_stream_becomes_variant(variant_name):
+    canonical, aliases, _ = dedupe(
+        make_station("a", "Capital FM", "http://stream.capital.co.uk/live", clickcount=100),
+        make_station("b", variant_name, "http://stream.capital.co.uk/live-320.ogg", codec="OGG", bitrate=320),
+    )
+    assert [s.id for s in canonical] == ["a"]
+    assert [v.id for v in canonical[0].variants] == ["b", "a"]
+    assert aliases == {"b": "a"}
+
+
+@pytest.mark.parametrize("first, second, codec, bitrate", [
+    # Same stream option, so nothing says the quality word is a stream marker
+    ("Capital FM", "Capital FM HQ", "MP3", 128),
+    # More than quality words apart
+    ("Radio High", "Radio Low", "AAC", 64),
+    ("Stream FM", "Mobile FM", "AAC", 64),
+])
+def test_quality_words_alone_do_not_merge(first, second, codec, bitrate):
+    canonical, _, _ = dedupe(
+        make_station("a", first, "http://stream.one.example/live"),
+        make_station("b", second, "http://stream.one.example/other", codec=codec, bitrate=bitrate),
+    )
+    assert len(canonical) == 2